@@ -0,0 +1,325 @@
+"""
+Benchmark the PHL catalog loader.
+
+Synthetic catalogs with the columns that Thang reads are generated at
+multiples of the real catalog size and loaded with each strategy into a
+throwaway PostgreSQL cluster.  Every load runs load_phl.py in its own
+process, so that its peak memory is measured in isolation, and reports
+through the loader's --metrics-file.
+
+Results are written as JSON together with the git revision, so that runs
+of different versions can be compared with --compare.
+"""
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import pathlib
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import psycopg2
+
+from load_phl import MONITORED_COLUMNS
+from phl_schema import CONSTELLATIONS, STARS, TABLES
+
+
+HERE = pathlib.Path(__file__).resolve().parent
+
+# Row counts of the real catalog.
+PLANETS_1X = 4048
+STARS_1X = 3024
+N_CONSTELLATIONS = 88
+
+# Extra load_phl.py arguments for each strategy.  The incremental strategy
+# refreshes a fully loaded database with a catalog where 1% of the planets
+# have changed.
+STRATEGIES = {
+    'rows': ['--method', 'rows'],
+    'values': ['--method', 'values'],
+    'copy': ['--method', 'copy'],
+    'incremental': ['--incremental'],
+}
+CHANGED_FRACTION = 0.01
+
+CATEGORIES = {
+    'p_detection': ['Transit', 'Radial Velocity', 'Microlensing', 'Imaging', 'TTV'],
+    'p_type': ['Jovian', 'Neptunian', 'Superterran', 'Terran', 'Subterran', 'Miniterran'],
+    'p_type_temp': ['Hot', 'Warm', 'Cold'],
+    's_type_temp': ['O', 'B', 'A', 'F', 'G', 'K', 'M'],
+    's_type': ['G2 V', 'K1 V', 'M3 V', 'F8', 'A0'],
+}
+
+
+def make_catalog(scale, seed=0):
+    """
+    Generate a PHL-shaped catalog.
+
+    Parameters
+    ----------
+    scale : int
+        Multiple of the real catalog's row counts.
+    seed : int
+        Random seed, so that every strategy loads the same data.
+
+    Returns
+    -------
+    pd.DataFrame
+        Columns named as in the CSV file.
+    """
+    rng = np.random.default_rng(seed)
+    n_planets = PLANETS_1X * scale
+    n_stars = STARS_1X * scale
+
+    # Every star has at least one planet.
+    host = np.concatenate([np.arange(n_stars), rng.integers(0, n_stars, n_planets - n_stars)])
+    rng.shuffle(host)
+    constellation = rng.integers(0, N_CONSTELLATIONS, n_stars)
+
+    data = {}
+    for table in TABLES:
+        n = n_stars if table in (STARS, CONSTELLATIONS) else n_planets
+        for col in table.columns:
+            if col.source is None:
+                continue
+            if col.source in CATEGORIES:
+                values = rng.choice(CATEGORIES[col.source], n)
+            elif col.sqltype == 'real':
+                values = rng.lognormal(0.0, 1.0, n).astype('float32')
+                values[rng.random(n) < 0.2] = np.nan
+            elif col.sqltype == 'integer':
+                values = rng.integers(0, 3, n)
+            elif col.sqltype == 'boolean':
+                values = rng.integers(0, 2, n)
+            elif col.sqltype == 'timestamp':
+                values = pd.Timestamp('2020-01-01') + pd.to_timedelta(rng.integers(0, 365, n), unit='D')
+            else:
+                values = np.full(n, '', dtype=object)
+            data[col.source] = values
+
+    data['p_name'] = np.array([f'Planet {i}' for i in range(n_planets)])
+    data['p_year'] = rng.integers(1989, 2021, n_planets)
+    data['s_name'] = np.array([f'Star {i}' for i in range(n_stars)])
+    data['s_constellation'] = np.array([f'Constellation {i}' for i in constellation])
+    data['s_constellation_abr'] = np.array([f'C{i:02d}' for i in constellation])
+    data['s_constellation_eng'] = np.array([f'Meaning {i}' for i in constellation])
+    for name in MONITORED_COLUMNS:
+        data[name] = np.full(n_planets, '', dtype=object)
+
+    # Spread the star columns over their planets.
+    star_sources = set(STARS.sources) | set(CONSTELLATIONS.sources)
+    for name in star_sources:
+        data[name] = data[name][host]
+
+    df = pd.DataFrame(data)
+    df.columns = [name.upper() for name in df.columns]
+    return df
+
+
+def change_catalog(df, fraction, seed=0):
+    """
+    Return a copy of the catalog with a fraction of the planets updated.
+    """
+    rng = np.random.default_rng(seed)
+    df = df.copy()
+    changed = rng.random(len(df)) < fraction
+    df.loc[changed, 'P_UPDATED'] = pd.Timestamp('2021-01-01')
+    df.loc[changed, 'P_ESI'] = rng.random(changed.sum()).astype('float32')
+    return df
+
+
+@contextlib.contextmanager
+def temporary_postgres(bindir=None):
+    """
+    Run a throwaway PostgreSQL cluster on a unix socket in a temporary
+    directory, with an empty phl database.
+
+    Yields
+    ------
+    dict
+        Environment variables that point libpq at the cluster.
+    """
+    if bindir is None:
+        pg_config = shutil.which('pg_config')
+        if pg_config is not None:
+            bindir = subprocess.check_output([pg_config, '--bindir'], text=True).strip()
+    initdb = os.path.join(bindir, 'initdb') if bindir else 'initdb'
+    pg_ctl = os.path.join(bindir, 'pg_ctl') if bindir else 'pg_ctl'
+
+    tmpdir = tempfile.mkdtemp(prefix='phl-bench-')
+    datadir = os.path.join(tmpdir, 'data')
+    try:
+        subprocess.run([initdb, '-D', datadir, '-U', 'postgres', '--auth=trust'],
+                       check=True, stdout=subprocess.DEVNULL)
+        options = f"-k {tmpdir} -c listen_addresses='' -c fsync=off"
+        subprocess.run([pg_ctl, '-D', datadir, '-o', options, '-w',
+                        '-l', os.path.join(tmpdir, 'log'), 'start'],
+                       check=True, stdout=subprocess.DEVNULL)
+
+        env = dict(os.environ, PGHOST=tmpdir, PGUSER='postgres')
+        conn = psycopg2.connect(dbname='postgres', host=tmpdir, user='postgres')
+        conn.autocommit = True
+        conn.cursor().execute('create database phl')
+        conn.close()
+
+        try:
+            yield env
+        finally:
+            subprocess.run([pg_ctl, '-D', datadir, '-m', 'immediate', 'stop'],
+                           check=True, stdout=subprocess.DEVNULL)
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+def reset_database(env):
+    conn = psycopg2.connect(dbname='phl', host=env.get('PGHOST'), user=env.get('PGUSER'))
+    with conn, conn.cursor() as cursor:
+        cursor.execute('drop table if exists planets, stars, constellations, '
+                       'catalog_loads, catalog_rows cascade')
+    conn.close()
+
+
+def run_loader(env, workdir, path, args):
+    """
+    Run load_phl.py in a fresh process.
+
+    Returns
+    -------
+    dict
+        The loader's metrics summary, plus the process wall time.
+    """
+    metrics_file = os.path.join(workdir, 'metrics.json')
+    # Keep the loader from stamping the user's chart result cache.
+    env = dict(env, PHL_CACHE_DIR=os.path.join(workdir, 'cache'))
+    command = [sys.executable, str(HERE / 'load_phl.py'), *args,
+               '--metrics-file', metrics_file, path]
+
+    start = time.perf_counter()
+    subprocess.run(command, check=True, env=env, cwd=workdir,
+                   stdout=subprocess.DEVNULL)
+    elapsed = time.perf_counter() - start
+
+    with open(metrics_file) as f:
+        metrics = json.load(f)
+    metrics['process_seconds'] = elapsed
+    return metrics
+
+
+def run_benchmarks(env, scales, strategies, workdir, logger=print):
+    results = []
+    for scale in scales:
+        df = make_catalog(scale)
+        path = os.path.join(workdir, f'catalog-{scale}x.csv')
+        df.to_csv(path, index=False)
+
+        for strategy in strategies:
+            reset_database(env)
+            run_path = path
+            if strategy == 'incremental':
+                run_loader(env, workdir, path, STRATEGIES['copy'])
+                run_path = os.path.join(workdir, f'catalog-{scale}x-changed.csv')
+                change_catalog(df, CHANGED_FRACTION).to_csv(run_path, index=False)
+
+            metrics = run_loader(env, workdir, run_path, STRATEGIES[strategy])
+            result = {
+                'scale': scale,
+                'strategy': strategy,
+                'planets': len(df),
+                'wall_seconds': metrics['wall_seconds'],
+                'process_seconds': metrics['process_seconds'],
+                'rows_per_second': len(df) / metrics['wall_seconds'],
+                'peak_rss_bytes': metrics['peak_rss_bytes'],
+                'statements': metrics['statements'],
+                'round_trips': metrics['round_trips'],
+                'phases': metrics['phases'],
+            }
+            results.append(result)
+            logger(format_result(result))
+    return results
+
+
+def format_result(result):
+    return (
+        f"{result['scale']:>4}x {result['strategy']:<12} "
+        f"{result['planets']:>8} planets  "
+        f"{result['wall_seconds']:8.2f} s  "
+        f"{result['rows_per_second']:10.0f} rows/s  "
+        f"{result['peak_rss_bytes'] / 2**20:7.1f} MiB  "
+        f"{result['round_trips']:>8} round trips"
+    )
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'describe', '--always', '--dirty'],
+                                       cwd=HERE, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old_path, new):
+    """
+    Print the change in wall time and peak memory against an earlier run.
+    """
+    with open(old_path) as f:
+        old = json.load(f)
+    baseline = {(r['scale'], r['strategy']): r for r in old['results']}
+
+    print(f"Compared with {old['revision']} ({old['date']}):")
+    for result in new['results']:
+        before = baseline.get((result['scale'], result['strategy']))
+        if before is None:
+            continue
+        wall = result['wall_seconds'] / before['wall_seconds'] - 1
+        rss = result['peak_rss_bytes'] / before['peak_rss_bytes'] - 1
+        print(f"{result['scale']:>4}x {result['strategy']:<12} "
+              f"wall {wall:+7.1%}  peak memory {rss:+7.1%}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the PHL catalog loader.')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100],
+                        help='multiples of the real catalog size')
+    parser.add_argument('--strategies', nargs='+', choices=list(STRATEGIES),
+                        default=list(STRATEGIES))
+    parser.add_argument('--pg-bin', help='directory holding initdb and pg_ctl')
+    parser.add_argument('--use-environment', action='store_true',
+                        help='use the server from the PG* environment variables '
+                             'instead of a throwaway one; its phl tables are dropped')
+    parser.add_argument('--output', help='results file, by default under bench_results/')
+    parser.add_argument('--compare', help='earlier results file to compare against')
+    args = parser.parse_args()
+
+    now = datetime.datetime.now()
+    revision = git_revision()
+    output = args.output
+    if output is None:
+        os.makedirs(HERE / 'bench_results', exist_ok=True)
+        output = HERE / 'bench_results' / f"load_phl-{now:%Y%m%dT%H%M%S}-{revision}.json"
+
+    with tempfile.TemporaryDirectory(prefix='phl-bench-') as workdir:
+        if args.use_environment:
+            server = contextlib.nullcontext(dict(os.environ))
+        else:
+            server = temporary_postgres(args.pg_bin)
+        with server as env:
+            results = run_benchmarks(env, args.scales, args.strategies, workdir)
+
+    report = {
+        'revision': revision,
+        'date': now.isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'results': results,
+    }
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'Results written to {output}')
+
+    if args.compare:
+        compare(args.compare, report)
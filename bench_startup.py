@@ -0,0 +1,126 @@
+"""
+Benchmark the import time of the loader and chart entry points.
+
+Each module is imported in a fresh interpreter under python -X importtime,
+several times, and the fastest cumulative import time is kept.  The run
+fails if a module pulls in a library that it should only import on the code
+paths that need it, or if its import time regressed against an earlier
+results file by more than the tolerance.
+"""
+import argparse
+import json
+import pathlib
+import subprocess
+import sys
+
+
+HERE = pathlib.Path(__file__).resolve().parent
+
+# Libraries that importing each entry point must not load.
+FORBIDDEN = {
+    'load_phl': ['pandas', 'sqlalchemy', 'matplotlib', 'seaborn', 'scipy'],
+    'phldb': ['psycopg2', 'matplotlib', 'seaborn', 'scipy'],
+    'charts': ['pandas', 'matplotlib', 'seaborn'],
+    'stats': ['matplotlib', 'seaborn'],
+    'render_charts': ['seaborn'],
+}
+REPEAT = 5
+TOLERANCE = 0.2
+
+
+def import_time(module):
+    """
+    Import a module in a fresh interpreter.
+
+    Returns
+    -------
+    seconds : float
+        Cumulative import time of the module.
+    imported : dict
+        Cumulative import time in seconds of every module that was loaded.
+    """
+    command = [sys.executable, '-X', 'importtime', '-c', f'import {module}']
+    proc = subprocess.run(command, cwd=HERE, capture_output=True, text=True, check=True)
+
+    # Lines look like "import time:  self [us] | cumulative | imported package"
+    # with nested imports indented under the package name.
+    imported = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, name = line.split('|')
+        if not cumulative.strip().isdigit():
+            continue
+        imported[name.strip()] = int(cumulative) / 1e6
+    return imported[module], imported
+
+
+def measure(modules, repeat=REPEAT):
+    results = {}
+    for module in modules:
+        times = []
+        for _ in range(repeat):
+            seconds, imported = import_time(module)
+            times.append(seconds)
+        top = sorted(imported.items(), key=lambda item: item[1], reverse=True)
+        results[module] = {
+            'seconds': min(times),
+            'forbidden': sorted(
+                name for name in imported
+                if name.split('.')[0] in FORBIDDEN.get(module, [])
+            ),
+            # The heaviest imports, not counting the module itself.
+            'heaviest': [name for name, _ in top[1:6]],
+        }
+    return results
+
+
+def regressions(results, baseline, tolerance=TOLERANCE):
+    """
+    Returns
+    -------
+    list of str
+        A message for every module that got slower than the tolerance.
+    """
+    messages = []
+    for module, result in results.items():
+        before = baseline.get(module)
+        if before is None:
+            continue
+        change = result['seconds'] / before['seconds'] - 1
+        if change > tolerance:
+            messages.append(f'{module} import time {change:+.0%} '
+                            f"({before['seconds']:.3f} s -> {result['seconds']:.3f} s)")
+    return messages
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark entry point import times.')
+    parser.add_argument('modules', nargs='*', default=list(FORBIDDEN),
+                        help='modules to import, by default every entry point')
+    parser.add_argument('--repeat', type=int, default=REPEAT)
+    parser.add_argument('--output', help='write the results here')
+    parser.add_argument('--baseline', help='earlier results file to guard against')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE,
+                        help='allowed slowdown against the baseline, as a fraction')
+    args = parser.parse_args()
+
+    results = measure(args.modules, args.repeat)
+    failures = []
+    for module, result in results.items():
+        print(f"{module:<16} {result['seconds']:7.3f} s  "
+              f"heaviest: {', '.join(result['heaviest'])}")
+        if result['forbidden']:
+            failures.append(f"{module} imports {', '.join(result['forbidden'])}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            failures += regressions(results, json.load(f), args.tolerance)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    for message in failures:
+        print(message, file=sys.stderr)
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,168 @@
+"""
+Bar charts of the PHL catalog summaries.
+
+Each function draws one summary, as returned by the phldb query function of
+the same purpose, onto the given axes.  The chart scripts draw a single
+chart on a figure of their own and stats.PHLPlot draws them all on one.
+Figures should come from subplots() here, so that they get the theme.
+"""
+import functools
+
+# Planet type labels, broken over two lines where they are long.  Planets
+# without a type are labelled 'Unknown'.
+PLANET_TYPE_LABELS = {
+    'Miniterran': 'Mini\nTerran',
+    'Subterran': 'Sub\nTerran',
+    'Superterran': 'Super\nTerran',
+}
+
+SPECTRAL_CLASSES = ['O', 'B', 'A', 'F', 'G', 'K', 'M']
+
+
+@functools.lru_cache(maxsize=None)
+def set_theme():
+    """
+    Apply the seaborn theme, once.  Seaborn takes longer to import than
+    everything else put together, so it waits until a chart is drawn.
+    """
+    import seaborn as sns
+    sns.set()
+
+
+def subplots(*args, **kwargs):
+    """
+    plt.subplots, with the theme applied first.
+    """
+    set_theme()
+    import matplotlib.pyplot as plt
+    return plt.subplots(*args, **kwargs)
+
+
+def annotate_bars(ax, color, **kwargs):
+    """
+    Label each vertical bar with its height and paint it.
+    """
+    for p in ax.patches:
+        height = p.get_height()
+        ax.annotate(f"{height}",
+                    xy=(p.get_x() + p.get_width() / 2, p.get_height()),
+                    xytext=(3, 0), # 3 points horizontal offset
+                    textcoords="offset points",
+                    ha='center', va='bottom', **kwargs)
+
+        p.set_color(color)
+
+
+def detection_methods(df, ax):
+    color = 'xkcd:faded green'
+
+    df.plot.barh(ax=ax, legend=None)
+    ax.set_title('Planet Detection Methods')
+    ax.set_xlabel('Number of Exoplanets')
+    ax.set_ylabel(None)
+
+    for p in ax.patches:
+        width = p.get_width()
+        ax.annotate(f"{width}",
+                    xy=(width, p.get_y() + p.get_height() / 2),
+                    xytext=(3, 0), # 3 points horizontal offset
+                    textcoords="offset points",
+                    ha='left', va='center')
+
+        p.set_color(color)
+
+    ax.set_xlim(0, 4000)
+
+
+def planet_types(df, ax):
+    color = 'xkcd:apricot'
+
+    df = df.copy()
+    df.index = [
+        PLANET_TYPE_LABELS.get(name, name) if isinstance(name, str) else 'Unknown'
+        for name in df.index
+    ]
+
+    df.plot.bar(ax=ax, legend=None)
+    ax.set_title('Planet Types')
+    ax.set_ylabel('Number of Exoplanets')
+    ax.set_xlabel(None)
+
+    annotate_bars(ax, color)
+
+    ax.set_ylim(0, 1400)
+    ax.tick_params(axis='x', rotation=0)
+
+
+def planet_discovery(df, ax):
+    color = 'xkcd:lavender'
+
+    df.plot.bar(ax=ax, legend=None)
+    ax.set_title('Planet Discovery Years')
+    ax.set_ylabel('Number of Exoplanets')
+    ax.set_xlabel(None)
+
+    annotate_bars(ax, color, fontsize=6)
+
+    # Only label every fifth year.
+    newlabels = [
+        h.get_text() if int(h.get_text()) % 5 == 0 else ''
+        for h in ax.get_xticklabels()
+    ]
+    ax.set_xticklabels(newlabels)
+    ax.tick_params(axis='x', rotation=0)
+
+
+def planets_per_star(df, ax):
+    color = 'xkcd:light violet'
+
+    df.plot.bar(ax=ax, legend=None)
+    ax.set_title('Stellar Systems')
+    ax.set_ylabel('Number of Stars')
+    ax.set_xlabel('Planets Per Star')
+
+    annotate_bars(ax, color)
+
+    ax.tick_params(axis='x', rotation=0)
+
+
+def star_age(df, ax):
+    color = 'xkcd:pale yellow'
+
+    df.plot.bar(ax=ax, legend=None)
+    ax.set_title('Stellar Ages')
+    ax.set_ylabel('Number of Stars')
+    ax.set_xlabel('Age (Gy)')
+
+    annotate_bars(ax, color)
+
+    ax.tick_params(axis='x', rotation=0)
+
+
+def stellar_classification(df, ax):
+    color = "xkcd:robin's egg blue"
+
+    df = df.copy()
+    df.index = [name if isinstance(name, str) else 'No Data' for name in df.index]
+    df = df.reindex(SPECTRAL_CLASSES + ['No Data'])
+
+    df.plot.bar(ax=ax, legend=None)
+    ax.set_title('Stellar Classification')
+    ax.set_ylabel('Number of Stars')
+    ax.set_xlabel(None)
+
+    annotate_bars(ax, color)
+
+    ax.set_ylim(0, 1400)
+    ax.tick_params(axis='x', rotation=0)
+
+
+# Each chart and the phldb summary that it draws.
+CHARTS = {
+    'detection_methods': (detection_methods, 'detection_counts'),
+    'planet_types': (planet_types, 'type_counts'),
+    'planet_discovery': (planet_discovery, 'discovery_years'),
+    'planets_per_star': (planets_per_star, 'planets_per_star'),
+    'star_age': (star_age, 'star_age_buckets'),
+    'stellar_classification': (stellar_classification, 'spectral_classes'),
+}
@@ -0,0 +1,173 @@
+"""
+Recompute the derived planet quantities of the catalog.
+
+PHL derives the escape velocity, gravity, density, orbit distances, stellar
+flux, equilibrium temperatures and so on from the base mass, radius, orbit
+and stellar luminosity.  Each quantity here recomputes one of those
+columns for the whole lower-cased catalog DataFrame at once with NumPy, so
+that the loader can check PHL's values on every load, and optionally fill
+in the ones that PHL left out.
+
+Circular orbits are assumed where the eccentricity is unknown.
+"""
+import collections
+
+import numpy as np
+import pandas as pd
+
+from validation import values
+
+
+# Earth mass in solar masses.
+EARTH_MASS = 3.0034896e-6
+
+# Equilibrium temperature (K) at 1 Earth flux, for a bond albedo of 0.3.
+TEMP_EQUIL_EARTH = 254.9
+
+# Allowed relative difference between PHL's values and ours.
+TOLERANCE = 0.02
+
+
+# column:       catalog column recomputed
+# inputs:       catalog columns it is computed from
+# compute:      function of the input columns as float arrays
+# description:  what it is
+Quantity = collections.namedtuple('Quantity', ['column', 'inputs', 'compute', 'description'])
+
+
+def temp_equil(flux):
+    return TEMP_EQUIL_EARTH * flux ** 0.25
+
+
+ORBIT = ['p_semi_major_axis', 'p_eccentricity']
+
+QUANTITIES = [
+    Quantity('p_escape', ['p_mass', 'p_radius'],
+             lambda m, r: np.sqrt(m / r),
+             'escape velocity, sqrt(M / R)'),
+    Quantity('p_potential', ['p_mass', 'p_radius'],
+             lambda m, r: m / r,
+             'gravitational potential, M / R'),
+    Quantity('p_gravity', ['p_mass', 'p_radius'],
+             lambda m, r: m / r**2,
+             'surface gravity, M / R^2'),
+    Quantity('p_density', ['p_mass', 'p_radius'],
+             lambda m, r: m / r**3,
+             'density, M / R^3'),
+    Quantity('p_hill_sphere', ORBIT + ['p_mass', 's_mass'],
+             lambda a, e, m, ms: a * (1 - e) * np.cbrt(m * EARTH_MASS / (3 * ms)),
+             'Hill sphere radius, a (1 - e) (M / 3 Ms)^(1/3)'),
+    Quantity('p_periastron', ORBIT,
+             lambda a, e: a * (1 - e),
+             'periastron, a (1 - e)'),
+    Quantity('p_apastron', ORBIT,
+             lambda a, e: a * (1 + e),
+             'apastron, a (1 + e)'),
+    Quantity('p_distance', ORBIT,
+             lambda a, e: a * (1 + e**2 / 2),
+             'time-averaged distance, a (1 + e^2 / 2)'),
+    Quantity('p_distance_eff', ORBIT,
+             lambda a, e: a * (1 - e**2) ** 0.25,
+             'distance of the mean flux, a (1 - e^2)^(1/4)'),
+    Quantity('p_flux', ORBIT + ['s_luminosity'],
+             lambda a, e, lum: lum / (a**2 * np.sqrt(1 - e**2)),
+             'mean flux, L / (a^2 sqrt(1 - e^2))'),
+    Quantity('p_flux_min', ORBIT + ['s_luminosity'],
+             lambda a, e, lum: lum / (a * (1 + e)) ** 2,
+             'flux at apastron, L / (a (1 + e))^2'),
+    Quantity('p_flux_max', ORBIT + ['s_luminosity'],
+             lambda a, e, lum: lum / (a * (1 - e)) ** 2,
+             'flux at periastron, L / (a (1 - e))^2'),
+    Quantity('p_temp_equil', ORBIT + ['s_luminosity'],
+             lambda a, e, lum: temp_equil(lum / (a**2 * np.sqrt(1 - e**2))),
+             'equilibrium temperature of the mean flux'),
+    Quantity('p_temp_equil_min', ORBIT + ['s_luminosity'],
+             lambda a, e, lum: temp_equil(lum / (a * (1 + e)) ** 2),
+             'equilibrium temperature at apastron'),
+    Quantity('p_temp_equil_max', ORBIT + ['s_luminosity'],
+             lambda a, e, lum: temp_equil(lum / (a * (1 - e)) ** 2),
+             'equilibrium temperature at periastron'),
+]
+
+
+def recompute(df, quantities=QUANTITIES):
+    """
+    Compute the quantities from a catalog DataFrame.
+
+    Returns
+    -------
+    pd.DataFrame
+        One column per quantity, NaN where an input is missing or the
+        result is not finite.
+    """
+    inputs = {column: values(df, column) for q in quantities for column in q.inputs}
+    eccentricity = inputs.get('p_eccentricity')
+    if eccentricity is not None:
+        inputs['p_eccentricity'] = np.where(np.isnan(eccentricity), 0, eccentricity)
+
+    computed = {}
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        for q in quantities:
+            x = q.compute(*(inputs[column] for column in q.inputs))
+            computed[q.column] = np.where(np.isfinite(x), x, np.nan)
+    return pd.DataFrame(computed, index=df.index)
+
+
+def check(df, quantities=QUANTITIES, tolerance=TOLERANCE, fill=False):
+    """
+    Compare PHL's derived columns with our own, and optionally fill the
+    gaps in them, in place.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Catalog rows, with lower-cased column names.
+    quantities : list of Quantity
+        Quantities to check.
+    tolerance : float
+        Allowed relative difference.
+    fill : bool
+        If true, fill the missing values of PHL's columns with ours.
+
+    Returns
+    -------
+    mismatches : collections.Counter
+        Number of rows that disagree beyond the tolerance, per column.
+    filled : collections.Counter
+        Number of values filled in, per column.
+    flagged : pd.DataFrame
+        One row per disagreeing row and column, as validation.validate
+        quarantines them:  the check, the planet name, and PHL's and our
+        values as a JSON object.
+    """
+    computed = recompute(df, quantities)
+
+    mismatches = collections.Counter()
+    filled = collections.Counter()
+    flags = []
+    for q in quantities:
+        ours = computed[q.column].to_numpy()
+        theirs = values(df, q.column)
+
+        mismatch = np.abs(theirs - ours) > tolerance * np.abs(ours)
+        n = int(mismatch.sum())
+        if n > 0:
+            mismatches[q.column] = n
+            pair = pd.DataFrame({q.column: theirs[mismatch], 'recomputed': ours[mismatch]})
+            flags.append(pd.DataFrame({
+                'rule': f'{q.column}_mismatch',
+                'planet': df.loc[mismatch, 'p_name'].to_numpy(),
+                'original': pair.to_json(orient='records', lines=True).splitlines(),
+            }))
+
+        if fill:
+            gap = np.isnan(theirs) & ~np.isnan(ours)
+            if gap.any():
+                filled[q.column] = int(gap.sum())
+                df.loc[gap, q.column] = ours[gap].astype(df[q.column].dtype)
+
+    if flags:
+        flagged = pd.concat(flags, ignore_index=True)
+    else:
+        flagged = pd.DataFrame(columns=['rule', 'planet', 'original'])
+    return mismatches, filled, flagged
@@ -0,0 +1,175 @@
+"""
+Habitable zone classification of the planets.
+
+Every planet is placed against every habitable zone of its host star in one
+array operation.  An orbit is in a zone by one of three criteria:
+
+    mean     the time-averaged distance is within the zone
+    full     the whole orbit, periastron to apastron, is within the zone
+    partial  some of the orbit is within the zone
+
+The distances come from the semi-major axis and eccentricity, circular
+where the eccentricity is unknown, so that what_if can reclassify the
+catalog in memory under changed orbits or zone bounds.  A planet or zone
+with unknown bounds is neither in nor out.
+
+The loader writes the classification of every new catalog to the
+planet_habzones table, one boolean column per zone and criterion.
+"""
+import io
+
+import numpy as np
+import pandas as pd
+
+
+HABZONE_TABLE = 'public.planet_habzones'
+
+# The habitable zones of the stars table, by the prefix of their bounds.
+ZONES = ['hz_opt', 'hz_con', 'hz_con0', 'hz_con1']
+CRITERIA = ['mean', 'full', 'partial']
+
+SQL = f"""
+    select planets.id as planet_id,
+           planets.name,
+           planets.semi_major_axis,
+           planets.eccentricity,
+           planets.habzone_opt,
+           planets.habzone_con,
+           {', '.join(f'stars.{zone}_min, stars.{zone}_max' for zone in ZONES)}
+      from planets
+      join stars on stars.id = planets.star_id
+"""
+
+
+def columns(zones=ZONES, criteria=CRITERIA):
+    """
+    The classification columns, e.g. hz_opt_mean.
+    """
+    return [f'{zone}_{criterion}' for zone in zones for criterion in criteria]
+
+
+def read_orbits(cursor):
+    """
+    Read the planets' orbits and their stars' zone bounds.
+
+    Returns
+    -------
+    pd.DataFrame
+        Indexed on planet id.
+    """
+    cursor.execute(SQL)
+    names = [d[0] for d in cursor.description]
+    return pd.DataFrame(cursor.fetchall(), columns=names).set_index('planet_id')
+
+
+def classify(orbits, zones=ZONES, criteria=CRITERIA):
+    """
+    Classify the planets.
+
+    Parameters
+    ----------
+    orbits : pd.DataFrame
+        The semi_major_axis and eccentricity of the planets, and the
+        <zone>_min and <zone>_max bounds of their stars, see read_orbits.
+    zones : list of str
+        Zones, from ZONES or any others with bounds in orbits.
+    criteria : list of str
+        Criteria, from CRITERIA.
+
+    Returns
+    -------
+    pd.DataFrame
+        A nullable boolean column per zone and criterion, on the index of
+        orbits.
+    """
+    unknown = set(criteria) - set(CRITERIA)
+    if unknown:
+        raise ValueError(f'unknown criteria {sorted(unknown)}')
+
+    def values(column):
+        return orbits[column].to_numpy(dtype='float64', na_value=np.nan)
+
+    a = values('semi_major_axis')
+    e = values('eccentricity')
+    e = np.where(np.isnan(e), 0, e)
+
+    # Distances are (planets, 1) and bounds are (planets, zones), so that
+    # the comparisons broadcast over every zone at once.
+    mean = (a * (1 + e**2 / 2))[:, np.newaxis]
+    periastron = (a * (1 - e))[:, np.newaxis]
+    apastron = (a * (1 + e))[:, np.newaxis]
+    low = np.column_stack([values(f'{zone}_min') for zone in zones])
+    high = np.column_stack([values(f'{zone}_max') for zone in zones])
+
+    tests = {
+        'mean': (low <= mean) & (mean <= high),
+        'full': (low <= periastron) & (apastron <= high),
+        'partial': (periastron <= high) & (low <= apastron),
+    }
+    unknown = np.isnan(mean) | np.isnan(low) | np.isnan(high)
+
+    classes = {}
+    for i, zone in enumerate(zones):
+        for criterion in criteria:
+            classes[f'{zone}_{criterion}'] = pd.arrays.BooleanArray(
+                tests[criterion][:, i], unknown[:, i]
+            )
+    return pd.DataFrame(classes, index=orbits.index)
+
+
+def what_if(orbits, zones=ZONES, criteria=CRITERIA, **changes):
+    """
+    Classify the planets with some columns of orbits changed, without
+    touching orbits or the database.
+
+    Parameters
+    ----------
+    changes
+        Replacement columns, as for pd.DataFrame.assign, e.g.
+        eccentricity=0 or hz_con_max=lambda df: df['hz_con_max'] * 1.1.
+
+    Returns
+    -------
+    pd.DataFrame
+        See classify.
+    """
+    return classify(orbits.assign(**changes), zones, criteria)
+
+
+def disagreements(orbits, classes):
+    """
+    Count the planets whose PHL habitable zone flags differ from the mean
+    criterion.
+
+    Returns
+    -------
+    dict
+        Number of differing planets per PHL flag.
+    """
+    counts = {}
+    for flag, column in [('habzone_opt', 'hz_opt_mean'), ('habzone_con', 'hz_con_mean')]:
+        theirs = orbits[flag].astype('boolean')
+        counts[flag] = int((theirs != classes[column]).fillna(False).sum())
+    return counts
+
+
+def write(cursor, classes, table=HABZONE_TABLE):
+    """
+    Replace the contents of a classification table, creating it if need
+    be, with one COPY.
+    """
+    body = ',\n            '.join(f'{column:<16} boolean' for column in classes.columns)
+    cursor.execute(f'drop table if exists {table}')
+    cursor.execute(f"""
+        create table {table} (
+            planet_id        integer primary key,
+            {body}
+        )
+    """)
+
+    buf = io.StringIO()
+    classes.to_csv(buf, header=False)
+    buf.seek(0)
+    cursor.copy_expert(
+        f"copy {table} (planet_id, {', '.join(classes.columns)}) from stdin with csv", buf
+    )
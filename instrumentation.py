@@ -0,0 +1,197 @@
+"""
+Phase timing and throughput metrics for the catalog loader.
+
+The loader wraps each phase of a run in LoadMetrics.phase.  Database work
+is counted by CountingConnection, which Thang uses for its own connection
+and for its pooled ones, and the totals are reported per phase as the
+difference between the counts at the start and the end of the phase.
+"""
+import collections
+import contextlib
+import json
+import os
+import resource
+import threading
+import time
+
+import psycopg2.extensions
+
+
+class CountingConnection(psycopg2.extensions.connection):
+    """
+    A connection whose cursors count statements, round trips and COPY bytes.
+    The counts are shared by every connection in the process.
+    """
+    lock = threading.Lock()
+    counts = collections.Counter()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cursor_factory = CountingCursor
+
+    @classmethod
+    def count(cls, key, n=1):
+        with cls.lock:
+            cls.counts[key] += n
+
+    @classmethod
+    def snapshot(cls):
+        with cls.lock:
+            return collections.Counter(cls.counts)
+
+    def commit(self):
+        self.count('round_trips')
+        super().commit()
+
+    def rollback(self):
+        self.count('round_trips')
+        super().rollback()
+
+
+class CountingCursor(psycopg2.extensions.cursor):
+
+    def execute(self, query, vars=None):
+        CountingConnection.count('statements')
+        CountingConnection.count('round_trips')
+        return super().execute(query, vars)
+
+    def executemany(self, query, vars_list):
+        vars_list = list(vars_list)
+        CountingConnection.count('statements', len(vars_list))
+        CountingConnection.count('round_trips', len(vars_list))
+        return super().executemany(query, vars_list)
+
+    def copy_expert(self, sql, file, size=8192):
+        CountingConnection.count('statements')
+        CountingConnection.count('round_trips')
+        return super().copy_expert(sql, CountingFile(file), size)
+
+
+class CountingFile(object):
+    """
+    Wrap a file object to count the bytes a COPY reads from or writes to it.
+    """
+
+    def __init__(self, file):
+        self.file = file
+
+    def read(self, size=-1):
+        data = self.file.read(size)
+        CountingConnection.count('copy_bytes', len(data))
+        return data
+
+    def readline(self, size=-1):
+        data = self.file.readline(size)
+        CountingConnection.count('copy_bytes', len(data))
+        return data
+
+    def write(self, data):
+        CountingConnection.count('copy_bytes', len(data))
+        return self.file.write(data)
+
+
+class LoadMetrics(object):
+    """
+    Per-phase wall and CPU time, rows, bytes, database statements and round
+    trips, plus the peak resident set size of the process.
+
+    Phases with the same name, e.g. one per streamed chunk, are summed.
+    """
+
+    # Summary key and help text for each per-phase Prometheus metric.
+    PROMETHEUS = [
+        ('wall_seconds', 'Wall-clock time per load phase.'),
+        ('cpu_seconds', 'Process CPU time per load phase.'),
+        ('rows', 'Rows processed per load phase.'),
+        ('rows_per_second', 'Row throughput per load phase.'),
+        ('bytes', 'Bytes read or copied per load phase.'),
+        ('statements', 'Database statements per load phase.'),
+        ('round_trips', 'Database round trips per load phase.'),
+    ]
+
+    def __init__(self):
+        self.phases = collections.OrderedDict()
+        self.start_wall = time.perf_counter()
+        self.start_cpu = time.process_time()
+        self.start_counts = CountingConnection.snapshot()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """
+        Time a phase of the load.  The caller may fill in 'rows' and 'bytes'
+        on the yielded record; bytes default to those sent through COPY.
+        """
+        record = {'rows': 0, 'bytes': None}
+        counts = CountingConnection.snapshot()
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield record
+        finally:
+            delta = CountingConnection.snapshot() - counts
+            if record['bytes'] is None:
+                record['bytes'] = delta['copy_bytes']
+
+            totals = self.phases.setdefault(name, collections.Counter())
+            totals['wall_seconds'] += time.perf_counter() - wall
+            totals['cpu_seconds'] += time.process_time() - cpu
+            totals['rows'] += record['rows']
+            totals['bytes'] += record['bytes']
+            totals['statements'] += delta['statements']
+            totals['round_trips'] += delta['round_trips']
+
+    def summary(self):
+        """
+        Returns
+        -------
+        dict
+            JSON-serializable metrics for the whole run and for each phase.
+        """
+        phases = {}
+        for name, totals in self.phases.items():
+            phase = dict(totals)
+            wall = totals['wall_seconds']
+            phase['rows_per_second'] = totals['rows'] / wall if wall > 0 else 0.0
+            phases[name] = phase
+
+        delta = CountingConnection.snapshot() - self.start_counts
+        return {
+            'wall_seconds': time.perf_counter() - self.start_wall,
+            'cpu_seconds': time.process_time() - self.start_cpu,
+            'statements': delta['statements'],
+            'round_trips': delta['round_trips'],
+            'copy_bytes': delta['copy_bytes'],
+            # ru_maxrss is reported in kilobytes on Linux.
+            'peak_rss_bytes': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+            'phases': phases,
+        }
+
+    def write_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.summary(), f, indent=2)
+
+    def write_prometheus(self, path):
+        """
+        Write the metrics in the Prometheus text format, e.g. for the
+        node_exporter textfile collector.  The file is replaced atomically.
+        """
+        summary = self.summary()
+
+        lines = []
+        for key, help_text in self.PROMETHEUS:
+            metric = f'phl_load_phase_{key}'
+            lines.append(f'# HELP {metric} {help_text}')
+            lines.append(f'# TYPE {metric} gauge')
+            for name, phase in summary['phases'].items():
+                lines.append(f'{metric}{{phase="{name}"}} {phase[key]}')
+
+        for key in ['wall_seconds', 'cpu_seconds', 'statements', 'round_trips',
+                    'copy_bytes', 'peak_rss_bytes']:
+            metric = f'phl_load_{key}'
+            lines.append(f'# TYPE {metric} gauge')
+            lines.append(f'{metric} {summary[key]}')
+
+        tmp = f'{path}.tmp'
+        with open(tmp, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(tmp, path)
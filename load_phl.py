@@ -1,17 +1,149 @@
+import argparse
+import collections
+import concurrent.futures
+import functools
+import io
+import json
 import logging
+import os
 import sys
 
-import pandas as pd
 import psycopg2
-import sqlalchemy
+import psycopg2.errors
+import psycopg2.extras
+import psycopg2.pool
+
+from instrumentation import CountingConnection, LoadMetrics
+import phlhash
+from phl_schema import CONSTELLATIONS, PLANETS, STARS, SUMMARY_VIEWS, TABLES
+
+
+# Catalog columns that are watched for new data but not loaded.
+MONITORED_COLUMNS = ['s_disc', 's_magnetic_field']
+
+# Swap mode builds the tables here before moving them into public.
+STAGING_SCHEMA = 'phl_staging'
+RETIRED_SCHEMA = 'phl_retired'
+
+# How rows are sent to the database:  one COPY per table, batched
+# INSERT ... VALUES statements, or one INSERT per row.
+METHODS = ['copy', 'values', 'rows']
+
+# Pipelined loads share at most this many extra connections.
+POOL_SIZE = 4
+
+# Original values cleared by validation, if kept.
+QUARANTINE_TABLE = 'public.catalog_quarantine'
+
+# Rows serialized for COPY ahead of time, by a pipelined load's worker
+# thread, PREPARED_CHUNKSIZE rows at a time so that each chunk is copied
+# while the next is being serialized.  The CSV holds the name of each row's
+# parent in the last column instead of the foreign key, which is only looked
+# up once staged.
+#
+# buffers:  futures of the CSV chunks, with the table's loaded columns in
+#           order, less key
+# rows:     number of rows
+# key:      foreign key column
+# parent:   table that the foreign key refers to
+Prepared = collections.namedtuple('Prepared', ['buffers', 'rows', 'key', 'parent'])
+PREPARED_CHUNKSIZE = 1000
 
 
 class Thang(object):
 
-    def __init__(self):
-        self.engine = sqlalchemy.create_engine('postgresql:///phl')
-        self.conn = psycopg2.connect(dbname='phl')
+    def __init__(self, path='phl_exoplanet_catalog.csv', incremental=False,
+                 swap=False, chunksize=None, pipeline=False,
+                 defer_indexes=False, metrics_file=None, prometheus_file=None,
+                 method='copy', snapshot=None, force=False, quarantine=False,
+                 fill_derived=False):
+        """
+        Parameters
+        ----------
+        path : str
+            The catalog CSV file.
+        incremental : bool
+            If true, merge the catalog into the existing tables instead of
+            dropping and recreating them.
+        swap : bool
+            If true, build the tables in a staging schema and swap them into
+            place in a single transaction once they are complete.
+        chunksize : int, optional
+            If given, stream the CSV file into the database this many rows at
+            a time rather than reading it all at once.
+        pipeline : bool
+            If true, prepare each stage's DataFrame in a worker thread while
+            the previous stage is being written, and run column comments and
+            post-load checks on pooled connections of their own.
+        defer_indexes : bool
+            If true, create bare tables and only add the primary keys, unique
+            names and foreign keys once the data is in.  Combined with
+            pipeline, independent builds run in parallel.
+        metrics_file : str, optional
+            Write the JSON load metrics summary here as well as to the log.
+        prometheus_file : str, optional
+            Write the load metrics here in the Prometheus text format.
+        method : str
+            How rows are sent to the database, one of METHODS.  COPY is by
+            far the fastest; the others are kept for benchmarking.
+        snapshot : str, optional
+            If given, also write the loaded tables to a Parquet snapshot in
+            this directory, see phlsnapshot.
+        force : bool
+            If true, load the catalog even if it is identical to the last
+            one loaded.
+        quarantine : bool
+            If true, keep the original values that validation clears, and the
+            derived values that disagree with our own, in the
+            catalog_quarantine table.
+        fill_derived : bool
+            If true, fill the derived columns that PHL left empty with our
+            own values, see derived.
+        """
+        if incremental and swap:
+            raise ValueError('incremental and swap loads are mutually exclusive')
+        if incremental and chunksize is not None:
+            raise ValueError('streaming loads cannot be incremental')
+        if incremental and defer_indexes:
+            raise ValueError('incremental loads need the unique names in place')
+        if method not in METHODS:
+            raise ValueError(f'method must be one of {METHODS}')
+
+        self.path = path
+        self.incremental = incremental
+        self.swap = swap
+        self.chunksize = chunksize
+        self.pipeline = pipeline
+        self.defer_indexes = defer_indexes
+        self.metrics_file = metrics_file
+        self.prometheus_file = prometheus_file
+        self.method = method
+        self.snapshot = snapshot
+        self.force = force
+        self.quarantine = quarantine
+        self.fill_derived = fill_derived
+        self.metrics = LoadMetrics()
+
+        # Maps each loaded name onto its row id, keyed by table.
+        self.ids = {'constellations': {}, 'stars': {}}
+
+        # Tables whose column comments wait for a pooled connection.
+        self.pending_comments = []
+
+        # The planets added or changed and those removed since the last load,
+        # if known, see detect_changes.
+        self.changed = None
+        self.removed = None
+
+        self.conn = psycopg2.connect(dbname='phl',
+                                     connection_factory=CountingConnection)
         self.cursor = self.conn.cursor()
+        if pipeline:
+            self.pool = psycopg2.pool.ThreadedConnectionPool(
+                1, POOL_SIZE, dbname='phl', connection_factory=CountingConnection
+            )
+        else:
+            self.pool = None
         self.setup_logging()
 
     def setup_logging(self):
@@ -35,753 +167,1050 @@ class Thang(object):
         self.logger = logger
 
     def __del__(self):
-        self.conn.commit()
+        # __init__ may have failed before connecting, e.g. on bad options.
+        conn = getattr(self, 'conn', None)
+        if conn is not None:
+            conn.commit()
+        pool = getattr(self, 'pool', None)
+        if pool is not None:
+            pool.closeall()
 
     def check_historically_empty_columns(self):
-        vars = [
-            's_disc',
-            's_magnetic_field',
-        ]
-        for varname in vars:
+        for varname in MONITORED_COLUMNS:
             s = self.df[varname].isnull().sum()
             if s < self.df.shape[0]:
                 self.logger.warning(f"{varname} now has some data")
 
     def xform_types(self):
-        self.df['p_habzone_opt'] = self.df['p_habzone_opt'].astype(bool)
-        self.df['p_habzone_con'] = self.df['p_habzone_con'].astype(bool)
+        self.df['p_habzone_opt'] = self.df['p_habzone_opt'].astype('boolean')
+        self.df['p_habzone_con'] = self.df['p_habzone_con'].astype('boolean')
 
     def preprocess(self):
         self.logger.info('Pre-processing...')
         self.check_historically_empty_columns()
         self.xform_types()
+        self.validate()
+        self.check_derived()
 
-    def postprocess(self):
-        self.check_for_bad_star_ages()
-
-    def check_for_bad_star_ages(self):
-        sql = """
-        select id
-        from stars
-        where age < 0
-        """
-        df = pd.read_sql(sql, self.conn)
-
-        if df.shape[0] > 0:
-            n = len(df)
-            ids = df.id.values
-            msg = (
-                f"Found {n} rows where star age is negative, IDs = ({ids}).  "
-                f"This value has been changed to NULL."
+    def validate(self):
+        """
+        Clear the values that break a validation rule, before anything is
+        written.
+        """
+        import validation
+
+        counts, quarantine = validation.validate(self.df)
+        descriptions = {rule.name: rule.description for rule in validation.RULES}
+        for name, n in counts.items():
+            self.logger.warning(f'{n} rows cleared by {name}:  {descriptions[name]}')
+
+        self.write_quarantine(quarantine)
+
+    def check_derived(self):
+        """
+        Recompute PHL's derived columns and report those that disagree.
+        """
+        import derived
+
+        mismatches, filled, flagged = derived.check(self.df, fill=self.fill_derived)
+        for column, n in mismatches.items():
+            self.logger.warning(f'{n} rows of {column} differ from the recomputed values '
+                                f'by more than {derived.TOLERANCE:.0%}')
+        for column, n in filled.items():
+            self.logger.info(f'{n} missing values of {column} filled in')
+
+        self.write_quarantine(flagged)
+
+    def write_quarantine(self, quarantine):
+        if self.quarantine and len(quarantine) > 0:
+            self.cursor.execute(f"""
+            create table if not exists {QUARANTINE_TABLE} (
+                rule            text not null,
+                planet          text,
+                original        jsonb,
+                quarantined_at  timestamp not null default now()
             )
+            """)
+            columns = {col: col for col in quarantine.columns}
+            self.copy_frame(quarantine, QUARANTINE_TABLE, columns)
 
-            self.logger.warning(msg)
+    def postprocess(self):
+        self.logger.info('Building indexes ...')
+        with self.metrics.phase('indexes'):
+            for phase in self.index_phases():
+                tasks = [functools.partial(self.execute_sql, sql) for sql in phase]
+                self.run_tasks(tasks)
+        self.logger.info('Done building indexes ...')
 
-            sql = """
-                  update stars
-                  set age = NULL
-                  where age < 0
-                  """
-            self.cursor.execute(sql)
+        self.logger.info('Building summary views ...')
+        with self.metrics.phase('summaries'):
+            tasks = [
+                functools.partial(self.execute_sql, sql, params=params)
+                for sql, params in self.summary_sql()
+            ]
+            self.run_tasks(tasks)
+        self.logger.info('Done building summary views ...')
+
+    def summary_sql(self):
+        """
+        Create the summary views, or refresh them if an incremental load kept
+        their tables.  A full load drops them along with the tables.
+        """
+        return [
+            view.refresh_sql() if self.reuse_table(view.name) else view.create_sql()
+            for view in SUMMARY_VIEWS
+        ]
+
+    def index_phases(self):
+        """
+        The post-load index and constraint builds, grouped into phases whose
+        statements are independent of each other.
+        """
+        phases = []
+        if self.defer_indexes:
+            phases.append([sql for table in TABLES for sql in table.constraint_sql()])
+            phases.append([sql for table in TABLES for sql in table.foreign_key_sql()])
+        phases.append([sql for table in TABLES for sql in table.index_sql()])
+        return phases
+
+    def execute_sql(self, sql, cursor, params=None):
+        cursor.execute(sql, params)
+
+    def run_tasks(self, tasks):
+        """
+        Run each task(cursor), concurrently on pooled connections in
+        pipeline mode or one after another on the main connection otherwise.
+        """
+        if not self.pipeline:
+            for task in tasks:
+                task(self.cursor)
+            return
+
+        # The tasks run on their own connections, so the data has to be
+        # visible to them first.
+        self.conn.commit()
+        search_path = self.get_search_path()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=POOL_SIZE) as executor:
+            futures = [
+                executor.submit(self.on_side_connection, search_path, task)
+                for task in tasks
+            ]
+            for future in futures:
+                future.result()
+
+    def on_side_connection(self, search_path, func, *args):
+        """
+        Run func(cursor, *args) in its own transaction on a pooled
+        connection, using the given search_path so that it sees the same
+        schema as the main connection.
+        """
+        conn = self.pool.getconn()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute('select set_config(%s, %s, false)',
+                               ('search_path', search_path))
+                func(cursor, *args)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.pool.putconn(conn)
+
+    def get_search_path(self):
+        # Only call this from the main thread, it uses the main cursor.
+        self.cursor.execute('show search_path')
+        return self.cursor.fetchone()[0]
 
     def run(self):
-        self.load_data()
-        self.preprocess()
-        self.create_constellations()
-        self.create_stars()
-        self.create_planets()
+        if not self.detect_changes():
+            version = self.catalog_version()
+            if self.snapshot is not None and not self.snapshot_is_current(version):
+                self.write_snapshot(version)
+            self.report_metrics()
+            return
+        if self.swap:
+            self.create_staging_schema()
+        if self.chunksize is None:
+            with self.metrics.phase('read') as phase:
+                self.load_data()
+                phase['rows'] = len(self.df)
+                phase['bytes'] = os.path.getsize(self.path)
+                if self.incremental and self.changed is not None:
+                    # The other planets were loaded and validated before.
+                    self.df = self.df[self.df['p_name'].isin(self.changed)].copy()
+            with self.metrics.phase('preprocess') as phase:
+                self.preprocess()
+                phase['rows'] = len(self.df)
+            if self.pipeline:
+                self.load_pipelined()
+            else:
+                self.create_constellations()
+                self.create_stars()
+                self.create_planets()
+        else:
+            self.stream_data()
+        if self.incremental:
+            with self.metrics.phase('delete_stale'):
+                if self.removed is None:
+                    self.delete_stale_rows()
+                else:
+                    self.delete_removed_rows()
         self.postprocess()
+        if self.swap:
+            with self.metrics.phase('swap'):
+                self.swap_in_staging_schema()
+        with self.metrics.phase('version'):
+            version = self.stamp_catalog_version()
+        with self.metrics.phase('similarity') as phase:
+            import phlcache
+            import similarity
+
+            index = similarity.build(self.cursor)
+            index.save(similarity.index_path(phlcache.ResultCache().directory, version))
+            phase['rows'] = len(index)
+        with self.metrics.phase('habzones') as phase:
+            phase['rows'] = self.classify_habzones()
+        if self.snapshot is not None:
+            self.write_snapshot(version)
+        # Only now that every phase has run can a later run skip this catalog.
+        with self.metrics.phase('record_load'):
+            self.record_load()
+        self.report_metrics()
+
+    def snapshot_is_current(self, version):
+        import phlsnapshot
+
+        try:
+            return phlsnapshot.version(self.snapshot) == version
+        except FileNotFoundError:
+            return False
+
+    def write_snapshot(self, version):
+        import phlsnapshot
+
+        with self.metrics.phase('snapshot') as phase:
+            self.logger.info(f'Writing the snapshot to {self.snapshot} ...')
+            phase['rows'] = phlsnapshot.write_snapshot(self.cursor, self.snapshot, version)
+
+    def fingerprint(self):
+        """
+        Fingerprint the generated DDL and the options that change what gets
+        written, so that a load with a new schema or new options is never
+        skipped as unchanged.
+        """
+        parts = []
+        for table in TABLES:
+            parts += [table.create_sql()] + table.foreign_key_sql() + table.index_sql()
+        for view in SUMMARY_VIEWS:
+            parts.append(json.dumps(view.create_sql(), default=str))
+        options = {
+            'defer_indexes': self.defer_indexes,
+            'fill_derived': self.fill_derived,
+            'quarantine': self.quarantine,
+        }
+        parts.append(json.dumps(options, sort_keys=True))
+        return phlhash.fingerprint(parts)
+
+    def detect_changes(self):
+        """
+        Compare the catalog file and the fingerprint with those of the last
+        load.  If only the file changed, an incremental load then only merges
+        the planets that were added or changed.
+
+        Returns
+        -------
+        bool
+            False if there is nothing to load.
+        """
+        with self.metrics.phase('detect_changes') as phase:
+            phase['bytes'] = os.path.getsize(self.path)
+            self.digest = phlhash.file_digest(self.path)
+            last = phlhash.last_load(self.cursor)
+            same_loader = last is not None and last['fingerprint'] == self.fingerprint()
+            if not self.force and same_loader and last['sha256'] == self.digest:
+                self.logger.info('The catalog is unchanged since the last load.')
+                return False
+
+            self.row_hashes = phlhash.row_hashes(self.path)
+            phase['rows'] = len(self.row_hashes)
+            if self.force or not same_loader:
+                # Forced, nothing loaded, the tables have gone since, or the
+                # schema or options changed, so every row has to be written.
+                return True
+
+            stored = phlhash.stored_row_hashes(self.cursor)
+
+            self.changed, self.removed = phlhash.diff(stored, self.row_hashes)
+            self.logger.info(f'{len(self.changed)} planets added or changed, '
+                             f'{len(self.removed)} removed since the last load.')
+            if self.changed or self.removed:
+                return True
+
+            # Only the file changed, e.g. its row order.
+            self.record_load()
+            self.stamp_catalog_version()
+            return False
+
+    def record_load(self):
+        phlhash.record_load(self.cursor, self.path, self.digest, self.fingerprint(),
+                            self.row_hashes)
+        self.conn.commit()
+
+    def classify_habzones(self):
+        """
+        Classify the loaded planets against their stars' habitable zones and
+        write the classes to the planet_habzones table.
+
+        Returns
+        -------
+        int
+            Number of planets classified.
+        """
+        import habzone
+
+        orbits = habzone.read_orbits(self.cursor)
+        classes = habzone.classify(orbits)
+        habzone.write(self.cursor, classes)
+        self.conn.commit()
+
+        for flag, n in habzone.disagreements(orbits, classes).items():
+            if n > 0:
+                self.logger.info(f'{n} planets differ from their {flag} flag '
+                                 f'by the mean distance criterion')
+        return len(classes)
+
+    def catalog_version(self):
+        import phlcache
+
+        return phlcache.catalog_version(self.digest, self.fingerprint())
+
+    def stamp_catalog_version(self):
+        """
+        Commit the load, then stamp the chart result cache with the version
+        of the new catalog, which invalidates the results of the old one.
+        """
+        import phlcache
+
+        self.conn.commit()
+        version = self.catalog_version()
+        phlcache.ResultCache().set_version(version)
+        self.logger.info(f'Catalog version {version}')
+        return version
+
+    def report_metrics(self):
+        summary = self.metrics.summary()
+        self.logger.info(f'Load metrics:  {json.dumps(summary)}')
+
+        if self.metrics_file is not None:
+            self.metrics.write_json(self.metrics_file)
+        if self.prometheus_file is not None:
+            self.metrics.write_prometheus(self.prometheus_file)
+
+    def create_staging_schema(self):
+        """
+        Point the session at an empty staging schema so that every table,
+        index and constraint is built out of sight of other readers.
+        """
+        self.cursor.execute(f'drop schema if exists {STAGING_SCHEMA} cascade')
+        self.cursor.execute(f'create schema {STAGING_SCHEMA}')
+        self.cursor.execute(f'set search_path to {STAGING_SCHEMA}')
+
+    def swap_in_staging_schema(self):
+        """
+        Replace the public tables and summary views with the staged ones in
+        one short transaction.  Indexes, constraints and serial sequences
+        travel with their tables.
+        """
+        self.conn.commit()
+        self.logger.info('Swapping staged tables into place ...')
+
+        relations = [('table', table.name) for table in TABLES]
+        relations += [('materialized view', view.name) for view in SUMMARY_VIEWS]
+
+        self.cursor.execute('reset search_path')
+        self.cursor.execute(f'drop schema if exists {RETIRED_SCHEMA} cascade')
+        self.cursor.execute(f'create schema {RETIRED_SCHEMA}')
+        for kind, name in relations:
+            self.cursor.execute(f'alter {kind} if exists public.{name} set schema {RETIRED_SCHEMA}')
+        for kind, name in relations:
+            self.cursor.execute(f'alter {kind} {STAGING_SCHEMA}.{name} set schema public')
+        self.cursor.execute(f'drop schema {RETIRED_SCHEMA} cascade')
+        self.cursor.execute(f'drop schema {STAGING_SCHEMA}')
+        self.conn.commit()
+
+        self.logger.info('Done swapping ...')
 
     def create_planets(self):
         self.logger.info('Creating planets ...')
-        self.define_planets()
-        self.load_planets()
+        with self.metrics.phase('planets') as phase:
+            if not self.reuse_table('planets'):
+                self.define_planets()
+            phase['rows'] = self.load_planets()
         self.logger.info('Done with planets ...')
 
     def create_stars(self):
         self.logger.info('Creating stars ...')
-        self.define_stars()
-        self.load_stars()
-        self.retrieve_star_id()
+        with self.metrics.phase('stars') as phase:
+            if not self.reuse_table('stars'):
+                self.define_stars()
+            phase['rows'] = self.load_stars()
         self.logger.info('Done with stars ...')
 
     def create_constellations(self):
         self.logger.info('Creating constellations ...')
-        self.define_constellations()
-        self.load_constellations()
+        with self.metrics.phase('constellations') as phase:
+            if not self.reuse_table('constellations'):
+                self.define_constellations()
+            phase['rows'] = self.load_constellations()
         self.logger.info('Done with constellations ...')
 
-    def retrieve_star_id(self):
+    def load_pipelined(self):
         """
-        get rid of the star name now that we have the ID.
+        Overlap DataFrame preparation with the database writes.  While one
+        stage is being written, a worker thread selects, deduplicates and
+        converts the columns for the next one, and the column comments are
+        issued on pooled connections.  With COPY, the worker also serializes
+        the rows, see Prepared.
+
+        The tables are committed empty before loading starts so that the
+        other connections can see them.
         """
-        df_stars = pd.read_sql('select * from stars', self.conn)
+        self.logger.info('Creating tables ...')
+        with self.metrics.phase('define'):
+            for table in TABLES:
+                if not self.reuse_table(table.name):
+                    self.define_table(table)
 
-        df = pd.merge(self.df, df_stars, how='inner', left_on='s_name', right_on='name')
-        df = df.drop('s_name', axis='columns')
-        df = df.rename(mapper={'id': 'star_id'}, axis='columns')
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as worker, \
+             concurrent.futures.ThreadPoolExecutor(max_workers=POOL_SIZE) as side:
+            comments = self.submit_comments(side)
+            if self.method == 'copy':
+                stars = worker.submit(self.prepare_copy, worker, self.prepare_stars, STARS,
+                                      'constellation_id', 's_constellation', 'constellations')
+                planets = worker.submit(self.prepare_copy, worker, self.prepare_planets, PLANETS,
+                                        'star_id', 's_name', 'stars')
+            else:
+                stars = worker.submit(self.prepare_stars)
+                planets = worker.submit(self.prepare_planets)
+
+            self.logger.info('Loading constellations ...')
+            with self.metrics.phase('constellations') as phase:
+                phase['rows'] = self.load_constellations()
+            self.logger.info('Loading stars ...')
+            with self.metrics.phase('stars') as phase:
+                phase['rows'] = self.load_stars(stars.result())
+            self.logger.info('Loading planets ...')
+            with self.metrics.phase('planets') as phase:
+                phase['rows'] = self.load_planets(planets.result())
+
+            for future in comments:
+                future.result()
+        self.logger.info('Done with tables ...')
+
+    def submit_comments(self, executor):
+        """
+        Commit any newly created tables, then hand their column comments to
+        pooled connections.
+
+        Returns
+        -------
+        list of concurrent.futures.Future
+        """
+        if not self.pending_comments:
+            return []
+
+        self.conn.commit()
+        search_path = self.get_search_path()
+        futures = [
+            executor.submit(self.on_side_connection, search_path,
+                            self.comment_table, table)
+            for table in self.pending_comments
+        ]
+        self.pending_comments = []
+        return futures
 
-        self.df = df
+    def reuse_table(self, table):
+        """
+        In incremental mode an existing table is kept and merged into.
+        """
+        if not self.incremental:
+            return False
+
+        self.cursor.execute('select to_regclass(%s)', (table,))
+        if self.cursor.fetchone()[0] is None:
+            return False
+
+        self.migrate_table(table)
+        return True
+
+    def migrate_table(self, name):
+        """
+        Bring a kept table that an older loader created up to the registry:
+        add the columns it lacks, backfilling those that the loader computes,
+        convert the columns whose type changed, and add the unique name that
+        the merge relies on.  Catalog columns are filled in by the merge
+        itself.
+        """
+        import skyindex
+
+        table = next((table for table in TABLES if table.name == name), None)
+        if table is None:
+            return
+
+        self.cursor.execute("""
+            select attname, format_type(atttypid, atttypmod)
+              from pg_attribute
+             where attrelid = %s::regclass and attnum > 0 and not attisdropped
+        """, (name,))
+        existing = dict(self.cursor.fetchall())
+        self.cursor.execute('select t, t::regtype::text from unnest(%s) as t',
+                            (list({col.sqltype for col in table.columns}),))
+        sqltypes = dict(self.cursor.fetchall())
+
+        missing = [col for col in table.columns if col.target not in existing]
+        for col in missing:
+            self.logger.info(f'Adding column {col.target} to {name} ...')
+            self.cursor.execute(f'alter table {name} add column if not exists '
+                                f'{col.target} {col.sqltype}')
+
+        for col in table.columns:
+            if col.target in existing and existing[col.target] != sqltypes[col.sqltype]:
+                self.logger.info(f'Converting {name}.{col.target} from '
+                                 f'{existing[col.target]} to {col.sqltype} ...')
+                self.cursor.execute(f'alter table {name} alter column {col.target} '
+                                    f'type {col.sqltype} using {col.target}::{col.sqltype}')
+
+        if table is STARS and 'sky_zone' in {col.target for col in missing}:
+            # The same zones as skyindex.zone, in double precision.
+            self.cursor.execute(
+                'update stars set sky_zone = floor((dec::float8 + 90) / %s) '
+                'where dec is not null',
+                (skyindex.ZONE_HEIGHT,)
+            )
+
+        self.cursor.execute("""
+            select exists (
+                select
+                  from pg_index
+                  join pg_attribute on attrelid = indrelid and attnum = indkey[0]
+                 where indrelid = %s::regclass
+                   and indisunique and indnatts = 1 and attname = 'name'
+            )
+        """, (name,))
+        if not self.cursor.fetchone()[0]:
+            self.logger.info(f'Adding a unique name to {name} ...')
+            try:
+                self.cursor.execute(f'alter table {name} '
+                                    f'add constraint {name}_name_key unique (name)')
+            except psycopg2.errors.UniqueViolation:
+                raise ValueError(f'{name} has duplicate names, so it cannot be merged '
+                                 f'into; load the catalog without --incremental') from None
+
+    def stream_data(self):
+        """
+        Push the CSV file through to the database one chunk at a time, so
+        that memory use is bounded by the chunk size instead of the file
+        size.  Constellations and stars are deduplicated against the names
+        that earlier chunks have already loaded.
+        """
+        with self.metrics.phase('define'):
+            self.define_constellations()
+            self.define_stars()
+            self.define_planets()
+
+        chunks = self.read_csv(chunksize=self.chunksize)
+        if self.pipeline:
+            chunks = self.prefetch(chunks)
+        chunks = self.timed_read(chunks)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=POOL_SIZE) as side:
+            comments = self.submit_comments(side)
+
+            for chunk in chunks:
+                self.df = chunk
+                self.logger.info(f'Loading a chunk of {len(chunk)} rows ...')
+                with self.metrics.phase('preprocess') as phase:
+                    self.preprocess()
+                    phase['rows'] = len(chunk)
+                with self.metrics.phase('constellations') as phase:
+                    phase['rows'] = self.load_constellations()
+                with self.metrics.phase('stars') as phase:
+                    phase['rows'] = self.load_stars()
+                with self.metrics.phase('planets') as phase:
+                    phase['rows'] = self.load_planets()
+
+            for future in comments:
+                future.result()
+
+        self.logger.info('Done streaming ...')
+
+    def timed_read(self, iterator):
+        """
+        Account the time spent waiting on each chunk to the read phase.
+        """
+        while True:
+            with self.metrics.phase('read') as phase:
+                chunk = next(iterator, None)
+                if chunk is None:
+                    phase['bytes'] = os.path.getsize(self.path)
+                else:
+                    phase['rows'] = len(chunk)
+                    phase['bytes'] = 0
+            if chunk is None:
+                return
+            yield chunk
+
+    def prefetch(self, iterator):
+        """
+        Read the next item in a worker thread while the caller is busy with
+        the current one.
+        """
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            future = executor.submit(next, iterator, None)
+            while True:
+                item = future.result()
+                if item is None:
+                    return
+                future = executor.submit(next, iterator, None)
+                yield item
+
+    def drop_loaded(self, df, table, key):
+        """
+        When streaming, remove rows whose names went in with an earlier chunk.
+        """
+        return df[~df[key].isin(self.ids[table].keys())]
+
+    def retrieve_star_id(self, df):
+        """
+        get rid of the star name now that we have the ID.
+        """
+        star_id = df['s_name'].map(self.ids['stars']).astype('Int64')
+        df = df.drop('s_name', axis='columns')
+        df['star_id'] = star_id
+        return df
 
     def load_data(self):
         self.logger.info('starting to read data from CSV file')
-        self.df = pd.read_csv('phl_exoplanet_catalog.csv',
-                              parse_dates=['P_UPDATED'])
+        self.df = self.read_csv()
         self.logger.info('finished reading data from CSV file')
 
+    def read_csv(self, chunksize=None):
+        """
+        Read only the catalog columns that are loaded or monitored.
+
+        Parameters
+        ----------
+        chunksize : int, optional
+            If given, return an iterator of DataFrames of this many rows.
+        """
+        import pandas as pd
+
+        wanted = set(MONITORED_COLUMNS)
+        dtypes = {name.upper(): str for name in MONITORED_COLUMNS}
+        parse_dates = []
+        for table in TABLES:
+            wanted.update(table.sources)
+            dtypes.update(table.dtypes)
+            parse_dates += table.parse_dates
+
+        reader = pd.read_csv(self.path,
+                             usecols=lambda name: name.lower() in wanted,
+                             dtype=dtypes,
+                             parse_dates=parse_dates,
+                             chunksize=chunksize)
+        if chunksize is None:
+            return self.lower_case_columns(reader)
+        return (self.lower_case_columns(chunk) for chunk in reader)
+
+    def lower_case_columns(self, df):
         # Make the columns all lower case.  Upper case causes issues.
-        cols = [x.lower() for x in self.df.columns]
-        self.df.columns = cols
+        df.columns = [x.lower() for x in df.columns]
+        return df
 
     def define_constellations(self):
-        sql = """
-        drop table if exists constellations cascade
+        self.define_table(CONSTELLATIONS)
+
+    def define_planets(self):
+        self.define_table(PLANETS)
+
+    def define_table(self, table):
         """
-        self.cursor.execute(sql)
+        Create a table, its foreign keys and its column comments from the
+        registry.
 
-        sql = """
-        create table constellations (
-            id                        serial primary key, 
-            name                      text,
-            abr                       text,
-            meaning                   text
-        )
+        Parameters
+        ----------
+        table : phl_schema.Table
+            Table to (re)create.
         """
-        self.cursor.execute(sql)
+        self.cursor.execute(f'drop table if exists {table.name} cascade')
+        self.cursor.execute(table.create_sql(constraints=not self.defer_indexes))
 
-        column_comments = {
-            'abr':              'constellation abreviated',
-        }
-        for key, value in column_comments.items():
-            sql = f"""
-            comment on column constellations.{key} is '{value}'
-            """
-            self.cursor.execute(sql, {'value': value})
+        if not self.defer_indexes:
+            for sql in table.foreign_key_sql():
+                self.cursor.execute(sql)
 
-    def define_planets(self):
-        sql = """
-        drop table if exists planets
+        if self.pipeline:
+            self.pending_comments.append(table)
+        else:
+            self.comment_table(self.cursor, table)
+
+    def comment_table(self, cursor, table):
+        for sql, params in table.comment_sql():
+            cursor.execute(sql, params)
+
+    def prepare_planets(self):
+        return self.df[PLANETS.sources + ['s_name']]
+
+    def load_planets(self, planets=None):
+        if planets is None:
+            planets = self.prepare_planets()
+        if isinstance(planets, Prepared):
+            rows = planets.rows
+        else:
+            planets = self.retrieve_star_id(planets)
+            rows = len(planets)
+
+        # When the changed rows are known from their hashes, or the load is
+        # forced, every row that differs is written, whether or not PHL
+        # bumped its last update.
+        changed = 'last_updated' if self.changed is None and not self.force else None
+        self.write_frame(planets, PLANETS.name, PLANETS.mapping, changed=changed)
+        return rows
+
+    def prepare_copy(self, executor, prepare, table, key, parent_source, parent):
         """
-        self.cursor.execute(sql)
+        Prepare a table's rows, and queue their serialization for COPY.
 
-        sql = """
-        create table planets (
-            id                        serial primary key, 
-            name                      text,
-            mass                      real,
-            mass_error_min            real,
-            mass_error_max            real,
-            radius                    real,
-            radius_error_min          real,
-            radius_error_max          real,
-            year_discovered           integer,
-            last_updated              timestamp,
-            period                    real,
-            period_error_min          real,
-            period_error_max          real,
-            semi_major_axis           real,
-            semi_major_axis_error_min real,
-            semi_major_axis_error_max real,
-            eccentricity              real,
-            eccentricity_error_min    real,
-            eccentricity_error_max    real,
-            inclination               real,
-            inclination_error_min     real,
-            inclination_error_max     real,
-            omega                     real,
-            omega_error_min           real,
-            omega_error_max           real,
-            tperi                     real,
-            tperi_error_min           real,
-            tperi_error_max           real,
-            angular_distance          real,
-            impact_parameter           real,
-            impact_parameter_error_min real,
-            impact_parameter_error_max real,
-            temp_measured             real,
-            geo_albedo                real,
-            geo_albedo_error_min      real,
-            geo_albedo_error_max      real,
-            detection                 text,
-            detection_mass            text,
-            detection_radius          real,
-            alt_names                 text,
-            atmosphere                text,
-            type                      text,
-            escape                    real,
-            potential                 real,
-            gravity                   real,
-            density                   real,
-            hill_sphere               real,
-            distance                  real,
-            periastron                real,
-            apastron                  real,
-            distance_eff              real,
-            flux                      real,
-            flux_min                  real,
-            flux_max                  real,
-            temp_equil                real,
-            temp_equil_min            real,
-            temp_equil_max            real,
-            habzone_opt               boolean,
-            habzone_con               boolean,
-            type_temp                 text,
-            habitable                 integer,
-            esi                       real,
-            star_id                   integer,
-            unique(name)
-        )
+        Parameters
+        ----------
+        executor : concurrent.futures.Executor
+            Where the chunks are serialized.
+        prepare : function
+            Returns the DataFrame to load, e.g. prepare_stars.
+        table : phl_schema.Table
+            Destination table.
+        key : str
+            Foreign key column, which is left out.
+        parent_source : str
+            DataFrame column with the name of the parent row.
+        parent : str
+            Parent table.
+
+        Returns
+        -------
+        Prepared
+        """
+        df = prepare()
+        sources = [source for target, source in table.mapping.items() if target != key]
+        sources.append(parent_source)
+        buffers = [
+            executor.submit(self.csv_buffer, df.iloc[i:i + PREPARED_CHUNKSIZE], sources)
+            for i in range(0, len(df), PREPARED_CHUNKSIZE)
+        ]
+        return Prepared(buffers, len(df), key, parent)
+
+    def prepare_constellations(self):
+        df = self.df[CONSTELLATIONS.sources].drop_duplicates()
+        return self.drop_loaded(df, 'constellations', 's_constellation')
+
+    def load_constellations(self):
+        df = self.prepare_constellations()
+        ids = self.write_frame(df, CONSTELLATIONS.name, CONSTELLATIONS.mapping,
+                               returning=True)
+        self.ids['constellations'].update(ids)
+        return len(df)
+
+    def write_frame(self, df, table, columns, changed=None, returning=False):
+        """
+        Load a DataFrame into a table, either wholesale or as a merge.
+
+        Returns
+        -------
+        dict or None
+            If returning is true, maps each loaded name onto its row id.
+        """
+        if self.incremental:
+            return self.upsert_frame(df, table, columns, changed=changed,
+                                     returning=returning)
+        elif returning or isinstance(df, Prepared):
+            # Prepared rows have to be staged to look up their keys.
+            return self.insert_frame(df, table, columns, returning=returning)
+        else:
+            self.send_frame(df, table, columns)
+
+    def send_frame(self, df, table, columns):
+        """
+        Write the rows of a DataFrame into a table using the configured
+        method.
+        """
+        if self.method == 'copy':
+            self.copy_frame(df, table, columns)
+            return
+
+        sql = f'insert into {table} ({", ".join(columns)}) values %s'
+        df = df[list(columns.values())]
+        rows = df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+
+        if self.method == 'values':
+            psycopg2.extras.execute_values(self.cursor, sql, rows)
+        else:
+            sql = sql.replace('%s', f'({", ".join(["%s"] * len(columns))})')
+            for row in rows:
+                self.cursor.execute(sql, row)
+
+    def copy_frame(self, df, table, columns):
+        """
+        Stream a DataFrame into a table with a single COPY.
+
+        Parameters
+        ----------
+        df : pd.DataFrame
+            Source data.
+        table : str
+            Destination table.
+        columns : dict
+            Maps each destination column onto its source column in df.
+        """
+        buffer = self.csv_buffer(df, list(columns.values()))
+        self.copy_buffer(buffer, table, list(columns))
+
+    def csv_buffer(self, df, sources):
+        """
+        Serialize DataFrame columns as CSV for COPY.
+        """
+        buffer = io.StringIO()
+        df[sources].to_csv(buffer, index=False, header=False)
+        buffer.seek(0)
+        return buffer
+
+    def copy_buffer(self, buffer, table, targets):
+        sql = f"""
+        copy {table} ({', '.join(targets)}) from stdin with (format csv)
+        """
+        self.cursor.copy_expert(sql, buffer)
+
+    def stage_frame(self, df, table, columns, stage):
+        """
+        COPY a DataFrame, or Prepared rows, into a new temporary table shaped
+        like the loaded columns of the destination table.
+        """
+        sql = f"""
+        create temporary table {stage} as
+        select {', '.join(columns)} from {table}
+        with no data
         """
         self.cursor.execute(sql)
+        if isinstance(df, Prepared):
+            self.stage_prepared(df, columns, stage)
+        else:
+            self.send_frame(df, stage, columns)
 
-        sql = """
-        alter  table planets
-        add constraint parent_star
-            foreign key (star_id)
-            references stars(id)
+    def stage_prepared(self, prepared, columns, stage):
+        """
+        COPY Prepared rows into a staging table, then fill in their foreign
+        keys from the names of their parents.
+        """
+        self.cursor.execute(f'alter table {stage} add column parent_name text')
+        targets = [col for col in columns if col != prepared.key] + ['parent_name']
+        for buffer in prepared.buffers:
+            self.copy_buffer(buffer.result(), stage, targets)
+
+        sql = f"""
+        update {stage}
+        set {prepared.key} = {prepared.parent}.id
+        from {prepared.parent}
+        where {prepared.parent}.name = {stage}.parent_name
         """
         self.cursor.execute(sql)
 
-        column_comments = {
-            'name':             'planet name',
-            'mass':             'earth masses',
-            'mass_error_min':   'earth masses',
-            'mass_error_max':   'earth masses',
-            'radius':           'earth radii',
-            'radius_error_min': 'earth radii',
-            'radius_error_max': 'earth radii',
-            'year_discovered':  'discovered year',
-            'period':           'period (days)',
-            'period_error_min': 'period min (days)',
-            'period_error_max': 'period max (days)',
-            'semi_major_axis':           'semi_major_axis (AU)',
-            'semi_major_axis_error_min': 'semi_major_axis error min (AU)',
-            'semi_major_axis_error_max': 'semi_major_axis error max (AU)',
-            'eccentricity':              'eccentricity',
-            'eccentricity_error_min':    'eccentricity error min',
-            'eccentricity_error_max':    'eccentricity error max',
-            'inclination':               'inclination (deg)',
-            'inclination_error_min':     'inclination error min (deg)',
-            'inclination_error_max':     'inclination error max (deg)',
-            'omega':                     'argument of periastron (deg)',
-            'omega_error_min':           'argument of periastron error min (deg)',
-            'omega_error_max':           'argument of periastron error max (deg)',
-            'tperi':                     'of periastron (seconds)',
-            'tperi_error_min':           'time of periastron error min (seconds)',
-            'tperi_error_max':           'time of periastron error max (seconds)',
-            'impact_parameter':            'impact parameter',
-            'impact_parameter_error_min':  'impact parameter error min',
-            'impact_parameter_error_max':  'impact parameter error max',
-            'angular_distance':          'planet-star angular separation (arcsec)',
-            'temp_measured':             'measured equilibrium temperature (K)',
-            'geo_albedo':                'measured geometric albedo',
-            'geo_albedo_error_min':      'measured geometric albedo error min',
-            'geo_albedo_error_max':      'measured geometric albedo error max',
-            'detection':                 'detection method',
-            'detection_mass':            'detection method for mass',
-            'detection_radius':          'detection method for radius',
-            'alt_names':                 'alternate names',
-            'atmosphere':                'atmosphere composition (no data yet)',
-            'type':                      'planet type (PHL''s mass-radius classification)',
-            'escape':                    'escape velocity (earth units)',
-            'potential':                 'gravitational potential (earth units)',
-            'gravity':                   'gravity (earth units)',
-            'density':                   'density (earth units)',
-            'hill_sphere':               'hill sphere (AU)',
-            'distance':                  'planet mean distance from star (AU)',
-            'periastron':                'periastron (AU)',
-            'apastron':                  'apastron (AU)',
-            'distance_eff':              'effective thermal distance from star (AU)',
-            'flux':                      'planet mean stellar flux (earth units)',
-            'flux_min':                  'planet minimum orbital stellar flux (earth units)',
-            'flux_max':                  'planet maximum orbital stellar flux (earth units)',
-            'temp_equil':                'equilibrium temperature assuming bond albedo 0.3 (K)',
-            'temp_equil_min':            'equilibrium minimum temperature assuming bond albedo 0.3 (K)',
-            'temp_equil_max':            'equilibrium maximum temperature assuming bond albedo 0.3 (K)',
-            'habzone_opt':               'the planet is in the optimistic habitable zone flag (1 = yes)',
-            'habzone_con':               'the planet is in the conservative habitable zone flag (1 = yes)',
-            'type_temp':                 'thermal type (PHL''s thermal classification)',
-            'habitable':                 'planet is potentially habitable index (1 = conservative, 2 = optimistic)',
-            'esi':                       'Earth similarity index',
-        }
-        for key, value in column_comments.items():
-            sql = f"""
-            comment on column planets.{key} is '{value}'
-            """
-            self.cursor.execute(sql, {'value': value})
-
-    def load_planets(self):
-
-        sql = """
-        insert into planets
-        (
-            name,
-            star_id,
-            mass,
-            mass_error_min,
-            mass_error_max,
-            radius,
-            radius_error_min,
-            radius_error_max,
-            year_discovered,
-            period,
-            period_error_min,
-            period_error_max,
-            semi_major_axis,
-            semi_major_axis_error_min,
-            semi_major_axis_error_max,
-            eccentricity,
-            eccentricity_error_min,
-            eccentricity_error_max,
-            inclination,
-            inclination_error_min,
-            inclination_error_max,
-            omega,
-            omega_error_min,
-            omega_error_max,
-            tperi,
-            tperi_error_min,
-            tperi_error_max,
-            impact_parameter,
-            impact_parameter_error_min,
-            impact_parameter_error_max,
-            angular_distance,
-            temp_measured,
-            geo_albedo,
-            geo_albedo_error_min,
-            geo_albedo_error_max,
-            detection,
-            detection_mass,
-            detection_radius,
-            alt_names,
-            atmosphere,
-            type,
-            escape,
-            potential,
-            gravity,
-            density,
-            hill_sphere,
-            distance,
-            periastron,
-            apastron,
-            distance_eff,
-            flux,
-            flux_min,
-            flux_max,
-            temp_equil,
-            temp_equil_min,
-            temp_equil_max,
-            habzone_opt,
-            habzone_con,
-            type_temp,
-            habitable,
-            esi
-        )
-        values
-        (
-            %(name)s,
-            %(star_id)s,
-            %(mass)s,
-            %(mass_error_min)s,
-            %(mass_error_max)s,
-            %(radius)s,
-            %(radius_error_min)s,
-            %(radius_error_max)s,
-            %(year_discovered)s,
-            %(p_period)s,
-            %(p_period_error_min)s,
-            %(p_period_error_max)s,
-            %(p_semi_major_axis)s,
-            %(p_semi_major_axis_error_min)s,
-            %(p_semi_major_axis_error_max)s,
-            %(p_eccentricity)s,
-            %(p_eccentricity_error_min)s,
-            %(p_eccentricity_error_max)s,
-            %(p_inclination)s,
-            %(p_inclination_error_min)s,
-            %(p_inclination_error_max)s,
-            %(p_omega)s,
-            %(p_omega_error_min)s,
-            %(p_omega_error_max)s,
-            %(p_tperi)s,
-            %(p_tperi_error_min)s,
-            %(p_tperi_error_max)s,
-            %(p_impact_parameter)s,
-            %(p_impact_parameter_error_min)s,
-            %(p_impact_parameter_error_max)s,
-            %(p_angular_distance)s,
-            %(p_temp_measured)s,
-            %(p_geo_albedo)s,
-            %(p_geo_albedo_error_min)s,
-            %(p_geo_albedo_error_max)s,
-            %(p_detection)s,
-            %(p_detection_mass)s,
-            %(p_detection_radius)s,
-            %(p_alt_names)s,
-            %(p_atmosphere)s,
-            %(p_type)s,
-            %(p_escape)s,
-            %(p_potential)s,
-            %(p_gravity)s,
-            %(p_density)s,
-            %(p_hill_sphere)s,
-            %(p_distance)s,
-            %(p_periastron)s,
-            %(p_apastron)s,
-            %(p_distance_eff)s,
-            %(p_flux)s,
-            %(p_flux_min)s,
-            %(p_flux_max)s,
-            %(p_temp_equil)s,
-            %(p_temp_equil_min)s,
-            %(p_temp_equil_max)s,
-            %(p_habzone_opt)s,
-            %(p_habzone_con)s,
-            %(p_type_temp)s,
-            %(p_habitable)s,
-            %(p_esi)s
-        )
+    def insert_frame(self, df, table, columns, returning=True):
         """
+        Insert a DataFrame by way of a temporary COPY target, so that the new
+        surrogate keys come straight back from INSERT ... RETURNING.
 
-        for idx, row in self.df.iterrows():
-            params = {
-                'name': row['p_name'],
-                'star_id': row['star_id'],
-                'mass': row['p_mass'],
-                'mass_error_min': row['p_mass_error_min'],
-                'mass_error_max': row['p_mass_error_max'],
-                'radius': row['p_radius'],
-                'radius_error_min': row['p_radius_error_min'],
-                'radius_error_max': row['p_radius_error_max'],
-                'year_discovered': row['p_year'],
-                'p_period': row['p_period'],
-                'p_period_error_min': row['p_period_error_min'],
-                'p_period_error_max': row['p_period_error_max'],
-                'p_semi_major_axis': row['p_semi_major_axis'],
-                'p_semi_major_axis_error_min': row['p_semi_major_axis_error_min'],
-                'p_semi_major_axis_error_max': row['p_semi_major_axis_error_max'],
-                'p_eccentricity': row['p_eccentricity'],
-                'p_eccentricity_error_min': row['p_eccentricity_error_min'],
-                'p_eccentricity_error_max': row['p_eccentricity_error_max'],
-                'p_inclination': row['p_inclination'],
-                'p_inclination_error_min': row['p_inclination_error_min'],
-                'p_inclination_error_max': row['p_inclination_error_max'],
-                'p_omega': row['p_omega'],
-                'p_omega_error_min': row['p_omega_error_min'],
-                'p_omega_error_max': row['p_omega_error_max'],
-                'p_tperi': row['p_tperi'],
-                'p_tperi_error_min': row['p_tperi_error_min'],
-                'p_tperi_error_max': row['p_tperi_error_max'],
-                'p_impact_parameter': row['p_impact_parameter'],
-                'p_impact_parameter_error_min': row['p_impact_parameter_error_min'],
-                'p_impact_parameter_error_max': row['p_impact_parameter_error_max'],
-                'p_angular_distance': row['p_angular_distance'],
-                'p_temp_measured': row['p_temp_measured'],
-                'p_geo_albedo': row['p_geo_albedo'],
-                'p_geo_albedo_error_min': row['p_geo_albedo_error_min'],
-                'p_geo_albedo_error_max': row['p_geo_albedo_error_max'],
-                'p_detection': row['p_detection'],
-                'p_detection_mass': row['p_detection_mass'],
-                'p_detection_radius': row['p_detection_radius'],
-                'p_alt_names': row['p_alt_names'],
-                'p_atmosphere': row['p_atmosphere'],
-                'p_type': row['p_type'],
-                'p_escape': row['p_escape'],
-                'p_potential': row['p_potential'],
-                'p_gravity': row['p_gravity'],
-                'p_density': row['p_density'],
-                'p_hill_sphere': row['p_hill_sphere'],
-                'p_distance': row['p_distance'],
-                'p_periastron': row['p_periastron'],
-                'p_apastron': row['p_apastron'],
-                'p_distance_eff': row['p_distance_eff'],
-                'p_flux': row['p_flux'],
-                'p_flux_min': row['p_flux_min'],
-                'p_flux_max': row['p_flux_max'],
-                'p_temp_equil': row['p_temp_equil'],
-                'p_temp_equil_min': row['p_temp_equil_min'],
-                'p_temp_equil_max': row['p_temp_equil_max'],
-                'p_habzone_opt': row['p_habzone_opt'],
-                'p_habzone_con': row['p_habzone_con'],
-                'p_type_temp': row['p_type_temp'],
-                'p_habitable': row['p_habitable'],
-                'p_esi': row['p_esi'],
-            }
-            self.cursor.execute(sql, params)
+        Returns
+        -------
+        dict or None
+            If returning is true, maps each inserted name onto its row id.
+        """
+        stage = f'{table}_new'
+        self.stage_frame(df, table, columns, stage)
 
-    def load_constellations(self):
-        cols = ['s_constellation', 's_constellation_abr', 's_constellation_eng']
-        df = self.df[cols].drop_duplicates()
+        cols = ', '.join(columns)
+        sql = f"""
+        insert into {table} ({cols})
+        select {cols} from {stage}
+        """
+        if returning:
+            sql += 'returning name, id'
+        self.cursor.execute(sql)
+        ids = dict(self.cursor.fetchall()) if returning else None
 
-        sql = """
-        insert into constellations (name, abr, meaning)
-        values %s
+        self.cursor.execute(f'drop table {stage}')
+        return ids
+
+    def upsert_frame(self, df, table, columns, changed=None, returning=False):
         """
+        Merge a DataFrame into an existing table keyed on its unique name.
 
-        arglist = [row.to_dict() for _, row in df.iterrows()]
-        template = (
-            '(%(s_constellation)s, '
-            '%(s_constellation_abr)s, '
-            '%(s_constellation_eng)s)'
-        )
-        psycopg2.extras.execute_values(self.cursor, sql, arglist, template)
+        The rows are staged with COPY into a temporary table and then applied
+        with INSERT ... ON CONFLICT, so only new or changed rows are written.
+        The staging table is kept until delete_stale_rows has run.
 
-    def define_stars(self):
-        sql = """
-        drop table if exists stars cascade
+        Parameters
+        ----------
+        df : pd.DataFrame
+            Source data.
+        table : str
+            Destination table, which must have a unique name column.
+        columns : dict
+            Maps each destination column onto its source column in df.
+        changed : str, optional
+            Column whose value decides whether a stored row is out of date,
+            e.g. a last-updated timestamp.  By default any difference in the
+            loaded columns triggers an update.
+        returning : bool
+            If true, return the row ids of every incoming name, changed or
+            not.
+
+        Returns
+        -------
+        dict or None
+            Maps each incoming name onto its row id.
         """
-        self.cursor.execute(sql)
+        stage = f'{table}_incoming'
+        cols = ', '.join(columns)
+        self.stage_frame(df, table, columns, stage)
 
-        sql = """
-        create table stars (
-            id                    serial primary key, 
-            name                  text,
-            ra                    real,
-            dec                   real,
-            mag                   real,
-            distance              real,
-            distance_error_min    real,
-            distance_error_max    real,
-            metallicity           real,
-            metallicity_error_min real,
-            metallicity_error_max real,
-            mass                  real,
-            mass_error_min        real,
-            mass_error_max        real,
-            radius                real,
-            radius_error_min      real,
-            radius_error_max      real,
-            type                  text,
-            age                   real,
-            age_error_min         real,
-            age_error_max         real,
-            temperature           real,
-            temperature_error_min real,
-            temperature_error_max real,
-            log_g                 real,
-            alt_names             text,
-            radius_est            real,
-            type_temp             text,
-            luminosity            real,
-            hz_opt_min            real,
-            hz_opt_max            real,
-            hz_con_min            real,
-            hz_con_max            real,
-            hz_con0_min            real,
-            hz_con0_max            real,
-            hz_con1_min            real,
-            hz_con1_max            real,
-            snow_line             real,
-            abio_zone             real,
-            tidal_lock            real,
-            constellation_id      integer,
-            unique(name)
+        if changed is None:
+            stored = ', '.join(f'{table}.{col}' for col in columns)
+            incoming = ', '.join(f'excluded.{col}' for col in columns)
+            condition = f'({stored}) is distinct from ({incoming})'
+        else:
+            condition = f'{table}.{changed} is distinct from excluded.{changed}'
+
+        assignments = ', '.join(
+            f'{col} = excluded.{col}' for col in columns if col != 'name'
         )
+
+        sql = f"""
+        insert into {table} ({cols})
+        select {cols} from {stage}
+        on conflict (name) do update
+        set {assignments}
+        where {condition}
         """
         self.cursor.execute(sql)
+        self.logger.info(f'{table}:  {self.cursor.rowcount} rows inserted or updated')
+
+        if returning:
+            sql = f'select name, id from {table} join {stage} using (name)'
+            self.cursor.execute(sql)
+            return dict(self.cursor.fetchall())
 
-        sql = """
-        alter  table stars
-        add constraint parent_constellation
-            foreign key (constellation_id)
-            references constellations(id)
+    def delete_stale_rows(self):
         """
-        self.cursor.execute(sql)
+        Remove rows that are no longer in the catalog.  Children go first so
+        that the foreign keys are never violated.
+        """
+        for table in reversed(TABLES):
+            stage = f'{table.name}_incoming'
+            sql = f"""
+            delete from {table.name}
+            where not exists (
+                select 1 from {stage} where {stage}.name = {table.name}.name
+            )
+            """
+            self.cursor.execute(sql)
+            self.logger.info(f'{table.name}:  {self.cursor.rowcount} rows deleted')
 
-        column_comments = {
-            'name':                  'star name',
-            'constellation_id':      'link back to constellation table',
-            'ra':                    'right ascension (decimal deg)',
-            'dec':                   'declination (decimal deg)',
-            'mag':                   'magnitude',
-            'distance':              'distance (parsecs)',
-            'distance_error_min':    'distance error min (parsecs)',
-            'distance_error_max':    'distance error max (parsecs)',
-            'metallicity':           'metallicity (parsecs)',
-            'metallicity_error_min': 'metallicity error min (parsecs)',
-            'metallicity_error_max': 'metallicity error max (parsecs)',
-            'mass':                  'mass (solar units)',
-            'mass_error_min':        'mass error min (solar units)',
-            'mass_error_max':        'mass error max (solar units)',
-            'radius':                'radius (solar units)',
-            'radius_error_min':      'radius error min (solar units)',
-            'radius_error_max':      'radius error max (solar units)',
-            'age':                   'age (Gy)',
-            'age_error_min':         'age error min (Gy)',
-            'age_error_max':         'age error max (Gy)',
-            'temperature':           'effective temperature (K)',
-            'temperature_error_min': 'effective temperature error min (K)',
-            'temperature_error_max': 'effective temperature error max (K)',
-            'log_g':                 'log(g)',
-            'alt_names':             'alternative names',
-            'type':                  'star spectral type',
-            'radius_est':            'radius estimated (solar units)',
-            'type_temp':             'spectral type',
-            'hz_opt_min':            'inner edge of the optimistic habitable zone (AU)',
-            'hz_opt_max':            'outer edge of the optimistic habitable zone (AU)',
-            'hz_con_min':            'inner edge of the conservative habitable zone (AU)',
-            'hz_con_max':            'outer edge of the conservative habitable zone (AU)',
-            'hz_con0_min':           'inner edge of the conservative habitable zone, mass = 0.1 Me (AU)',
-            'hz_con0_max':           'outer edge of the conservative habitable zone, mass = 0.1 Me (AU)',
-            'hz_con1_min':           'inner edge of the conservative habitable zone, mass = 5 Me (AU)',
-            'hz_con1_max':           'outer edge of the conservative habitable zone, mass = 5 Me (AU)',
-            'snow_line':             'snow line (AU)',
-            'abio_zone':             'abiogenesis zone outer edge (AU)',
-            'tidal_lock':            'tidal lock zone outder edge (AU)',
-            'luminosity':            'luminosity (stellar units)',
-        }
+            self.cursor.execute(f'drop table {stage}')
 
-        for key, value in column_comments.items():
+    def delete_removed_rows(self):
+        """
+        Remove the planets that are no longer in the catalog, then the stars
+        and constellations left without any.  Only the changed planets were
+        merged, so their staging tables cannot tell what is stale.
+        """
+        self.cursor.execute('delete from planets where name = any(%s)',
+                            (sorted(self.removed),))
+        self.logger.info(f'planets:  {self.cursor.rowcount} rows deleted')
+
+        for table, child, key in [('stars', 'planets', 'star_id'),
+                                  ('constellations', 'stars', 'constellation_id')]:
             sql = f"""
-            comment on column stars.{key} is '{value}'
+            delete from {table}
+            where not exists (
+                select 1 from {child} where {child}.{key} = {table}.id
+            )
             """
-            self.cursor.execute(sql, {'value': value})
-
-    def load_stars(self):
-
-        columns = [
-            's_name',
-            's_constellation',
-            's_ra',
-            's_dec',
-            's_mag',
-            's_distance',
-            's_distance_error_min',
-            's_distance_error_max',
-            's_metallicity',
-            's_metallicity_error_min',
-            's_metallicity_error_max',
-            's_mass',
-            's_mass_error_min',
-            's_mass_error_max',
-            's_radius',
-            's_radius_error_min',
-            's_radius_error_max',
-            's_age',
-            's_age_error_min',
-            's_age_error_max',
-            's_temperature',
-            's_temperature_error_min',
-            's_temperature_error_max',
-            's_log_g',
-            's_alt_names',
-            's_type',
-            's_radius_est',
-            's_type_temp',
-            's_luminosity',
-            's_hz_opt_min',
-            's_hz_opt_max',
-            's_hz_con_min',
-            's_hz_con_max',
-            's_hz_con0_min',
-            's_hz_con0_max',
-            's_hz_con1_min',
-            's_hz_con1_max',
-            's_snow_line',
-            's_abio_zone',
-            's_tidal_lock',
-        ]
-        stars = self.df[columns].drop_duplicates()
-
-        constellations = pd.read_sql('select * from constellations', self.conn)
-        df = pd.merge(stars, constellations,
-                      how='inner', left_on='s_constellation', right_on='name') 
-
-        sql = """
-        insert into stars
-        (
-            name,
-            constellation_id,
-            ra,
-            dec,
-            mag,
-            distance,
-            distance_error_min,
-            distance_error_max,
-            metallicity,
-            metallicity_error_min,
-            metallicity_error_max,
-            mass,
-            mass_error_min,
-            mass_error_max,
-            radius,
-            radius_error_min,
-            radius_error_max,
-            age,
-            age_error_min,
-            age_error_max,
-            temperature,
-            temperature_error_min,
-            temperature_error_max,
-            log_g,
-            alt_names,
-            type,
-            radius_est,
-            type_temp,
-            luminosity,
-            hz_opt_min,
-            hz_opt_max,
-            hz_con_min,
-            hz_con_max,
-            hz_con0_min,
-            hz_con0_max,
-            hz_con1_min,
-            hz_con1_max,
-            snow_line,
-            abio_zone,
-            tidal_lock
-        )
-        values %s
-        """
-
-        arglist = [row.to_dict() for _, row in df.iterrows()]
-
-        targs = ', '.join([
-            '%(s_name)s',
-            '%(id)s',
-            '%(s_ra)s',
-            '%(s_dec)s',
-            '%(s_mag)s',
-            '%(s_distance)s',
-            '%(s_distance_error_min)s',
-            '%(s_distance_error_max)s',
-            '%(s_metallicity)s',
-            '%(s_metallicity_error_min)s',
-            '%(s_metallicity_error_max)s',
-            '%(s_mass)s',
-            '%(s_mass_error_min)s',
-            '%(s_mass_error_max)s',
-            '%(s_radius)s',
-            '%(s_radius_error_min)s',
-            '%(s_radius_error_max)s',
-            '%(s_age)s',
-            '%(s_age_error_min)s',
-            '%(s_age_error_max)s',
-            '%(s_temperature)s',
-            '%(s_temperature_error_min)s',
-            '%(s_temperature_error_max)s',
-            '%(s_log_g)s',
-            '%(s_alt_names)s',
-            '%(s_type)s',
-            '%(s_radius_est)s',
-            '%(s_type_temp)s',
-            '%(s_luminosity)s',
-            '%(s_hz_opt_min)s',
-            '%(s_hz_opt_max)s',
-            '%(s_hz_con_min)s',
-            '%(s_hz_con_max)s',
-            '%(s_hz_con0_min)s',
-            '%(s_hz_con0_max)s',
-            '%(s_hz_con1_min)s',
-            '%(s_hz_con1_max)s',
-            '%(s_snow_line)s',
-            '%(s_abio_zone)s',
-            '%(s_tidal_lock)s',
-        ])
-        template = f'({targs})'
-
-        psycopg2.extras.execute_values(self.cursor, sql, arglist, template)
+            self.cursor.execute(sql)
+            self.logger.info(f'{table}:  {self.cursor.rowcount} rows deleted')
+
+        for table in TABLES:
+            self.cursor.execute(f'drop table {table.name}_incoming')
+
+    def define_stars(self):
+        self.define_table(STARS)
+
+    def prepare_stars(self):
+        import skyindex
+
+        stars = self.df[STARS.sources + ['s_constellation']].drop_duplicates()
+        stars = self.drop_loaded(stars, 'stars', 's_name')
+        return stars.assign(sky_zone=skyindex.zone(stars['s_dec']))
+
+    def load_stars(self, stars=None):
+        if stars is None:
+            stars = self.prepare_stars()
+        if isinstance(stars, Prepared):
+            rows = stars.rows
+        else:
+            constellation_id = stars['s_constellation'].map(self.ids['constellations'])
+            stars = stars.assign(constellation_id=constellation_id.astype('Int64'))
+            rows = len(stars)
+
+        ids = self.write_frame(stars, STARS.name, STARS.mapping, returning=True)
+        self.ids['stars'].update(ids)
+        return rows
+
 
 if __name__ == '__main__':
-    o = Thang()
+    parser = argparse.ArgumentParser(description='Load the PHL exoplanet catalog.')
+    parser.add_argument('--incremental', action='store_true',
+                        help='merge into the existing tables instead of rebuilding them')
+    parser.add_argument('--swap', action='store_true',
+                        help='build the tables in a staging schema, then swap them in')
+    parser.add_argument('--chunksize', type=int,
+                        help='stream the CSV file this many rows at a time')
+    parser.add_argument('--pipeline', action='store_true',
+                        help='overlap DataFrame preparation with the database writes')
+    parser.add_argument('--defer-indexes', action='store_true',
+                        help='add keys, constraints and indexes after loading')
+    parser.add_argument('--metrics-file',
+                        help='write the JSON load metrics summary to this file')
+    parser.add_argument('--prometheus-file',
+                        help='write the load metrics to this Prometheus textfile')
+    parser.add_argument('--method', choices=METHODS, default='copy',
+                        help='how rows are sent to the database')
+    parser.add_argument('--snapshot', metavar='DIR',
+                        help='also write the tables to a Parquet snapshot here')
+    parser.add_argument('--quarantine', action='store_true',
+                        help='keep the values cleared by validation in a table')
+    parser.add_argument('--fill-derived', action='store_true',
+                        help='fill the derived columns that the catalog leaves empty')
+    parser.add_argument('--force', action='store_true',
+                        help='load the catalog even if it has not changed')
+    parser.add_argument('path', nargs='?', default='phl_exoplanet_catalog.csv',
+                        help='catalog CSV file')
+    args = parser.parse_args()
+
+    o = Thang(path=args.path, incremental=args.incremental, swap=args.swap,
+              chunksize=args.chunksize, pipeline=args.pipeline,
+              defer_indexes=args.defer_indexes, metrics_file=args.metrics_file,
+              prometheus_file=args.prometheus_file, method=args.method,
+              snapshot=args.snapshot, force=args.force,
+              quarantine=args.quarantine, fill_derived=args.fill_derived)
     o.run()
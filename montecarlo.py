@@ -0,0 +1,259 @@
+"""
+Monte Carlo uncertainty of the chart histograms.
+
+Every object's value is drawn many times from a split normal distribution:
+a normal distribution with the error_max deviation above the catalog
+value and the error_min deviation below it, so that the catalog value
+stays the median.  Values without errors are drawn as they are, and draws
+below zero, which none of the physical quantities can take, are clipped to
+zero.  Each sample is then classified into the histogram bins, and the
+spread of the bin counts over the samples gives a confidence interval for
+every bin.
+
+The draws form one (objects, samples) array, processed a chunk of objects
+at a time so that it stays within a memory budget, optionally on a pool of
+processes.  Each block of BLOCK objects has a random stream of its own,
+and chunks are whole blocks, so that the result only depends on the seed,
+not on the memory budget or the pool.
+"""
+import concurrent.futures
+import functools
+
+import numpy as np
+import pandas as pd
+
+import phldb
+from phl_schema import STAR_AGE_LIMITS
+
+
+MEMORY_BUDGET = 256 * 2**20
+SAMPLES = 1000
+CONFIDENCE = 0.95
+
+# Bytes per draw at the peak, which is while the draws are classified:  the
+# float32 draw itself, a float32 working copy and the intp bin.  Everything
+# else is done in place.
+BYTES_PER_DRAW = 4 + 4 + 8
+
+# Objects per random stream.
+BLOCK = 256
+
+# PHL's mass classes, by upper mass limit (Earth masses).
+PLANET_MASS_CLASSES = [
+    (0.1, 'Miniterran'),
+    (0.5, 'Subterran'),
+    (2, 'Terran'),
+    (10, 'Superterran'),
+    (50, 'Neptunian'),
+    (np.inf, 'Jovian'),
+]
+
+
+def sample(value, error_min, error_max, samples, seeds):
+    """
+    Draw samples of each object's value.
+
+    Parameters
+    ----------
+    value, error_min, error_max : np.ndarray
+        Catalog values and their errors, of either sign.  Missing errors
+        count as zero.
+    samples : int
+        Samples per object.
+    seeds : list of np.random.SeedSequence
+        The seed of each block of BLOCK objects.
+
+    Returns
+    -------
+    np.ndarray
+        float32 draws, one row per object and one column per sample.
+    """
+    value = np.asarray(value, dtype='float32')[:, np.newaxis]
+    below = np.nan_to_num(np.abs(np.asarray(error_min, dtype='float32')))[:, np.newaxis]
+    above = np.nan_to_num(np.abs(np.asarray(error_max, dtype='float32')))[:, np.newaxis]
+
+    z = np.empty((len(value), samples), dtype='float32')
+    for i, seed in enumerate(seeds):
+        rng = np.random.default_rng(seed)
+        rng.standard_normal(dtype='float32', out=z[i * BLOCK:(i + 1) * BLOCK])
+    positive = z > 0
+    np.multiply(z, above, out=z, where=positive)
+    np.multiply(z, below, out=z, where=np.logical_not(positive, out=positive))
+    z += value
+    # NaN draws stay NaN.
+    return np.maximum(z, 0, out=z)
+
+
+def bin_counts(bins, n_bins):
+    """
+    Count the objects in each bin, per sample.
+
+    Parameters
+    ----------
+    bins : np.ndarray
+        Bin of each draw, (objects, samples).  An intp array is overwritten.
+
+    Returns
+    -------
+    np.ndarray
+        (n_bins, samples) counts.
+    """
+    samples = bins.shape[1]
+    flat = bins.astype('intp', copy=False)
+    flat *= samples
+    flat += np.arange(samples)
+    return np.bincount(flat.ravel(), minlength=n_bins * samples).reshape(n_bins, samples)
+
+
+def simulate_chunk(value, error_min, error_max, classify, n_bins, samples, seeds):
+    # The draws are freed as soon as they are classified.
+    bins = classify(sample(value, error_min, error_max, samples, seeds))
+    return bin_counts(bins, n_bins)
+
+
+def simulate(value, error_min, error_max, classify, n_bins, samples=SAMPLES,
+             seed=None, memory=MEMORY_BUDGET, workers=None):
+    """
+    Count the objects in each histogram bin, for each of many samples.
+
+    Parameters
+    ----------
+    value, error_min, error_max : array_like
+        Catalog values and their errors.
+    classify : function
+        Maps an array of values onto an array of bins in range(n_bins).  It
+        must be picklable to run on a pool, and stay within BYTES_PER_DRAW
+        for the memory budget to hold.
+    n_bins : int
+        Number of bins.
+    samples : int
+        Number of samples.
+    seed : int, optional
+        Seed of the random streams.
+    memory : int
+        Budget in bytes for the draws held at once, over all processes.
+        Each process holds at least one block of draws.
+    workers : int, optional
+        If given, process the chunks on a pool of this many processes.
+
+    Returns
+    -------
+    np.ndarray
+        (n_bins, samples) counts.
+    """
+    value, error_min, error_max = (np.asarray(x, dtype='float32')
+                                   for x in (value, error_min, error_max))
+    seeds = np.random.SeedSequence(seed).spawn(-(-len(value) // BLOCK))
+    blocks = max(1, memory // ((workers or 1) * samples * BYTES_PER_DRAW * BLOCK))
+    chunk = blocks * BLOCK
+    args = [
+        (value[i:i + chunk], error_min[i:i + chunk], error_max[i:i + chunk],
+         classify, n_bins, samples, seeds[i // BLOCK:i // BLOCK + blocks])
+        for i in range(0, len(value), chunk)
+    ]
+
+    counts = np.zeros((n_bins, samples), dtype='int64')
+    if workers is None:
+        for a in args:
+            counts += simulate_chunk(*a)
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            for result in executor.map(simulate_chunk, *zip(*args)):
+                counts += result
+    return counts
+
+
+def intervals(counts, point, labels, confidence=CONFIDENCE):
+    """
+    Summarize the sampled counts of each bin.
+
+    Parameters
+    ----------
+    counts : np.ndarray
+        (bins, samples) counts, see simulate.
+    point : np.ndarray
+        Counts of the catalog values.
+    labels : list of str
+        Bin labels.
+    confidence : float
+        Confidence level of the intervals.
+
+    Returns
+    -------
+    pd.DataFrame
+        Indexed on label:  the point count n, and the median, low and high
+        counts over the samples.
+    """
+    tail = (1 - confidence) / 2 * 100
+    low, median, high = np.percentile(counts, [tail, 50, 100 - tail], axis=1)
+    return pd.DataFrame({'n': point, 'median': median, 'low': low, 'high': high},
+                        index=pd.Index(labels, name='bin'))
+
+
+def planet_mass_class(mass):
+    """
+    PHL's mass class of each mass, see PLANET_MASS_CLASSES, or the last bin
+    if the mass is unknown.
+    """
+    # Count the limits at or below each mass, as np.digitize does, but
+    # without its float64 copy of the masses.
+    bins = np.zeros(np.shape(mass), dtype='intp')
+    for limit, _ in PLANET_MASS_CLASSES[:-1]:
+        bins += mass >= np.float64(limit)
+    bins[np.isnan(mass)] = len(PLANET_MASS_CLASSES)
+    return bins
+
+
+def star_age_bucket(age, young=STAR_AGE_LIMITS['young'], old=STAR_AGE_LIMITS['old']):
+    """
+    The bucket of each age, as phl_schema.STAR_AGE_BUCKETS orders them, or
+    the last bin if the age is unknown.
+    """
+    bucket = np.floor(age)
+    bucket -= young - 1
+    np.clip(bucket, 0, old - young + 1, out=bucket)
+    bucket[np.isnan(age)] = old - young + 2
+    return bucket.astype('intp')
+
+
+def star_age_labels(young=STAR_AGE_LIMITS['young'], old=STAR_AGE_LIMITS['old']):
+    return ([f'< {young}']
+            + [f'{age}-{age + 1}' for age in range(young, old)]
+            + [f'> {old}', 'No Data'])
+
+
+def histogram_intervals(df, column, classify, labels, samples, confidence, **kwargs):
+    """
+    Confidence intervals of a histogram of a column with <column>_error_min
+    and <column>_error_max errors.
+    """
+    value = df[column].to_numpy(dtype='float32', na_value=np.nan)
+    counts = simulate(value,
+                      df[f'{column}_error_min'].to_numpy(dtype='float32', na_value=np.nan),
+                      df[f'{column}_error_max'].to_numpy(dtype='float32', na_value=np.nan),
+                      classify, len(labels), samples, **kwargs)
+    point = np.bincount(classify(value), minlength=len(labels))
+    return intervals(counts, point, labels, confidence)
+
+
+def planet_type_intervals(samples=SAMPLES, confidence=CONFIDENCE, **kwargs):
+    """
+    Confidence intervals of the planet counts by mass class, see simulate
+    for the keyword arguments.
+    """
+    df = phldb.read('select mass, mass_error_min, mass_error_max from planets')
+    labels = [name for _, name in PLANET_MASS_CLASSES] + ['Unknown']
+    return histogram_intervals(df, 'mass', planet_mass_class, labels, samples, confidence,
+                               **kwargs)
+
+
+def star_age_intervals(young=STAR_AGE_LIMITS['young'], old=STAR_AGE_LIMITS['old'],
+                       samples=SAMPLES, confidence=CONFIDENCE, **kwargs):
+    """
+    Confidence intervals of the star counts by age bucket, see simulate for
+    the keyword arguments.
+    """
+    df = phldb.read('select age, age_error_min, age_error_max from stars')
+    classify = functools.partial(star_age_bucket, young=young, old=old)
+    return histogram_intervals(df, 'age', classify, star_age_labels(young, old), samples,
+                               confidence, **kwargs)
@@ -0,0 +1,362 @@
+"""
+Column registry for the normalized PHL catalog tables.
+
+Every table column is declared exactly once, together with the catalog CSV
+column that feeds it, its SQL type, the dtype used when reading the CSV and
+its column comment.  The loader generates its DDL, comments, read_csv
+arguments and bulk-load mappings from these declarations.
+
+The materialized summary views that the charts read are declared here too,
+so that the loader can rebuild them after every load.
+"""
+import collections
+
+
+# source:   lower-cased CSV column, or None if the loader derives the value
+# target:   table column
+# sqltype:  PostgreSQL type
+# dtype:    dtype for pd.read_csv, or None to let pandas decide
+# comment:  column comment, or None
+Column = collections.namedtuple(
+    'Column', ['source', 'target', 'sqltype', 'dtype', 'comment']
+)
+
+
+class Table(object):
+    """
+    A catalog table:  an id serial primary key, the declared columns, a
+    unique name, optionally foreign keys onto parent tables and indexes
+    supporting the analysis queries.
+    """
+
+    def __init__(self, name, columns, foreign_keys=None, indexes=None):
+        """
+        Parameters
+        ----------
+        name : str
+            Table name.
+        columns : list of Column
+            Table columns, in DDL order.
+        foreign_keys : dict, optional
+            Maps each constraint name onto a (column, parent table) pair.
+        indexes : list of str or tuple, optional
+            Columns that get a plain btree index, or tuples of columns that
+            get a composite one.
+        """
+        self.name = name
+        self.columns = columns
+        self.foreign_keys = foreign_keys or {}
+        self.indexes = indexes or []
+
+    @property
+    def mapping(self):
+        """
+        Maps each table column onto the DataFrame column that feeds it.
+        Derived columns are expected under their table column name.
+        """
+        return {col.target: col.source or col.target for col in self.columns}
+
+    @property
+    def sources(self):
+        """
+        The CSV columns read for this table.
+        """
+        return [col.source for col in self.columns if col.source is not None]
+
+    @property
+    def dtypes(self):
+        """
+        The read_csv dtype map, keyed on the upper-cased CSV column names.
+        """
+        return {
+            col.source.upper(): col.dtype
+            for col in self.columns
+            if col.source is not None and col.dtype is not None
+        }
+
+    @property
+    def parse_dates(self):
+        return [
+            col.source.upper()
+            for col in self.columns
+            if col.source is not None and col.sqltype == 'timestamp'
+        ]
+
+    def create_sql(self, constraints=True):
+        """
+        Parameters
+        ----------
+        constraints : bool
+            If false, create a bare table without the primary key and unique
+            name, to be added later by constraint_sql.
+        """
+        if constraints:
+            lines = ['id serial primary key']
+        else:
+            lines = ['id serial']
+        lines += [f'{col.target:<26} {col.sqltype}' for col in self.columns]
+        if constraints:
+            lines += ['unique(name)']
+        body = ',\n            '.join(lines)
+        return f"""
+        create table {self.name} (
+            {body}
+        )
+        """
+
+    def constraint_sql(self):
+        """
+        The primary key and unique name of a bare table, in one statement so
+        that the table is only locked once.
+        """
+        return [f"""
+        alter table {self.name}
+        add primary key (id),
+        add constraint {self.name}_name_key unique (name)
+        """]
+
+    def index_sql(self):
+        statements = []
+        for columns in self.indexes:
+            if isinstance(columns, str):
+                columns = (columns,)
+            statements.append(
+                f"create index if not exists {self.name}_{'_'.join(columns)}_idx "
+                f"on {self.name} ({', '.join(columns)})"
+            )
+        return statements
+
+    def foreign_key_sql(self):
+        statements = []
+        for constraint, (column, parent) in self.foreign_keys.items():
+            sql = f"""
+            alter table {self.name}
+            add constraint {constraint}
+                foreign key ({column})
+                references {parent}(id)
+            """
+            statements.append(sql)
+        return statements
+
+    def comment_sql(self):
+        """
+        Returns
+        -------
+        list of (sql, params) pairs
+        """
+        return [
+            (f'comment on column {self.name}.{col.target} is %s', (col.comment,))
+            for col in self.columns
+            if col.comment is not None
+        ]
+
+
+class SummaryView(object):
+    """
+    A materialized view of category counts over a catalog table, one row per
+    category of each summarized dimension.  The dimension column names the
+    summary a row belongs to.
+    """
+
+    def __init__(self, name, query, params=None):
+        """
+        Parameters
+        ----------
+        name : str
+            View name.
+        query : str
+            The defining query, with %(name)s placeholders for params.
+        params : dict, optional
+            Query parameters, interpolated when the view is created.
+        """
+        self.name = name
+        self.query = query
+        self.params = params
+
+    def create_sql(self):
+        """
+        Returns
+        -------
+        (sql, params) pair
+        """
+        return f'create materialized view {self.name} as {self.query}', self.params
+
+    def refresh_sql(self):
+        return f'refresh materialized view {self.name}', None
+
+
+CONSTELLATIONS = Table('constellations', [
+    Column('s_constellation',     'name',    'text', str, None),
+    Column('s_constellation_abr', 'abr',     'text', str, 'constellation abreviated'),
+    Column('s_constellation_eng', 'meaning', 'text', str, None),
+])
+
+STARS = Table('stars', [
+    Column('s_name',                  'name',                  'text',    str,        'star name'),
+    Column('s_ra',                    'ra',                    'real',    'float32',  'right ascension (decimal deg)'),
+    Column('s_dec',                   'dec',                   'real',    'float32',  'declination (decimal deg)'),
+    Column('s_mag',                   'mag',                   'real',    'float32',  'magnitude'),
+    Column('s_distance',              'distance',              'real',    'float32',  'distance (parsecs)'),
+    Column('s_distance_error_min',    'distance_error_min',    'real',    'float32',  'distance error min (parsecs)'),
+    Column('s_distance_error_max',    'distance_error_max',    'real',    'float32',  'distance error max (parsecs)'),
+    Column('s_metallicity',           'metallicity',           'real',    'float32',  'metallicity (parsecs)'),
+    Column('s_metallicity_error_min', 'metallicity_error_min', 'real',    'float32',  'metallicity error min (parsecs)'),
+    Column('s_metallicity_error_max', 'metallicity_error_max', 'real',    'float32',  'metallicity error max (parsecs)'),
+    Column('s_mass',                  'mass',                  'real',    'float32',  'mass (solar units)'),
+    Column('s_mass_error_min',        'mass_error_min',        'real',    'float32',  'mass error min (solar units)'),
+    Column('s_mass_error_max',        'mass_error_max',        'real',    'float32',  'mass error max (solar units)'),
+    Column('s_radius',                'radius',                'real',    'float32',  'radius (solar units)'),
+    Column('s_radius_error_min',      'radius_error_min',      'real',    'float32',  'radius error min (solar units)'),
+    Column('s_radius_error_max',      'radius_error_max',      'real',    'float32',  'radius error max (solar units)'),
+    Column('s_type',                  'type',                  'text',    'category', 'star spectral type'),
+    Column('s_age',                   'age',                   'real',    'float32',  'age (Gy)'),
+    Column('s_age_error_min',         'age_error_min',         'real',    'float32',  'age error min (Gy)'),
+    Column('s_age_error_max',         'age_error_max',         'real',    'float32',  'age error max (Gy)'),
+    Column('s_temperature',           'temperature',           'real',    'float32',  'effective temperature (K)'),
+    Column('s_temperature_error_min', 'temperature_error_min', 'real',    'float32',  'effective temperature error min (K)'),
+    Column('s_temperature_error_max', 'temperature_error_max', 'real',    'float32',  'effective temperature error max (K)'),
+    Column('s_log_g',                 'log_g',                 'real',    'float32',  'log(g)'),
+    Column('s_alt_names',             'alt_names',             'text',    str,        'alternative names'),
+    Column('s_radius_est',            'radius_est',            'real',    'float32',  'radius estimated (solar units)'),
+    Column('s_type_temp',             'type_temp',             'text',    'category', 'spectral type'),
+    Column('s_luminosity',            'luminosity',            'real',    'float32',  'luminosity (stellar units)'),
+    Column('s_hz_opt_min',            'hz_opt_min',            'real',    'float32',  'inner edge of the optimistic habitable zone (AU)'),
+    Column('s_hz_opt_max',            'hz_opt_max',            'real',    'float32',  'outer edge of the optimistic habitable zone (AU)'),
+    Column('s_hz_con_min',            'hz_con_min',            'real',    'float32',  'inner edge of the conservative habitable zone (AU)'),
+    Column('s_hz_con_max',            'hz_con_max',            'real',    'float32',  'outer edge of the conservative habitable zone (AU)'),
+    Column('s_hz_con0_min',           'hz_con0_min',           'real',    'float32',  'inner edge of the conservative habitable zone, mass = 0.1 Me (AU)'),
+    Column('s_hz_con0_max',           'hz_con0_max',           'real',    'float32',  'outer edge of the conservative habitable zone, mass = 0.1 Me (AU)'),
+    Column('s_hz_con1_min',           'hz_con1_min',           'real',    'float32',  'inner edge of the conservative habitable zone, mass = 5 Me (AU)'),
+    Column('s_hz_con1_max',           'hz_con1_max',           'real',    'float32',  'outer edge of the conservative habitable zone, mass = 5 Me (AU)'),
+    Column('s_snow_line',             'snow_line',             'real',    'float32',  'snow line (AU)'),
+    Column('s_abio_zone',             'abio_zone',             'real',    'float32',  'abiogenesis zone outer edge (AU)'),
+    Column('s_tidal_lock',            'tidal_lock',            'real',    'float32',  'tidal lock zone outder edge (AU)'),
+    Column(None,                      'constellation_id',      'integer', None,       'link back to constellation table'),
+    Column(None,                      'sky_zone',              'integer', None,       'declination zone of the cone search index, see skyindex'),
+], foreign_keys={'parent_constellation': ('constellation_id', 'constellations')},
+   indexes=['type_temp', ('sky_zone', 'ra')])
+
+PLANETS = Table('planets', [
+    Column('p_name',                       'name',                       'text',      str,        'planet name'),
+    Column('p_mass',                       'mass',                       'real',      'float32',  'earth masses'),
+    Column('p_mass_error_min',             'mass_error_min',             'real',      'float32',  'earth masses'),
+    Column('p_mass_error_max',             'mass_error_max',             'real',      'float32',  'earth masses'),
+    Column('p_radius',                     'radius',                     'real',      'float32',  'earth radii'),
+    Column('p_radius_error_min',           'radius_error_min',           'real',      'float32',  'earth radii'),
+    Column('p_radius_error_max',           'radius_error_max',           'real',      'float32',  'earth radii'),
+    Column('p_year',                       'year_discovered',            'integer',   'Int64',    'discovered year'),
+    Column('p_updated',                    'last_updated',               'timestamp', None,       'date of the last catalog update'),
+    Column('p_period',                     'period',                     'real',      'float32',  'period (days)'),
+    Column('p_period_error_min',           'period_error_min',           'real',      'float32',  'period min (days)'),
+    Column('p_period_error_max',           'period_error_max',           'real',      'float32',  'period max (days)'),
+    Column('p_semi_major_axis',            'semi_major_axis',            'real',      'float32',  'semi_major_axis (AU)'),
+    Column('p_semi_major_axis_error_min',  'semi_major_axis_error_min',  'real',      'float32',  'semi_major_axis error min (AU)'),
+    Column('p_semi_major_axis_error_max',  'semi_major_axis_error_max',  'real',      'float32',  'semi_major_axis error max (AU)'),
+    Column('p_eccentricity',               'eccentricity',               'real',      'float32',  'eccentricity'),
+    Column('p_eccentricity_error_min',     'eccentricity_error_min',     'real',      'float32',  'eccentricity error min'),
+    Column('p_eccentricity_error_max',     'eccentricity_error_max',     'real',      'float32',  'eccentricity error max'),
+    Column('p_inclination',                'inclination',                'real',      'float32',  'inclination (deg)'),
+    Column('p_inclination_error_min',      'inclination_error_min',      'real',      'float32',  'inclination error min (deg)'),
+    Column('p_inclination_error_max',      'inclination_error_max',      'real',      'float32',  'inclination error max (deg)'),
+    Column('p_omega',                      'omega',                      'real',      'float32',  'argument of periastron (deg)'),
+    Column('p_omega_error_min',            'omega_error_min',            'real',      'float32',  'argument of periastron error min (deg)'),
+    Column('p_omega_error_max',            'omega_error_max',            'real',      'float32',  'argument of periastron error max (deg)'),
+    Column('p_tperi',                      'tperi',                      'real',      'float32',  'of periastron (seconds)'),
+    Column('p_tperi_error_min',            'tperi_error_min',            'real',      'float32',  'time of periastron error min (seconds)'),
+    Column('p_tperi_error_max',            'tperi_error_max',            'real',      'float32',  'time of periastron error max (seconds)'),
+    Column('p_angular_distance',           'angular_distance',           'real',      'float32',  'planet-star angular separation (arcsec)'),
+    Column('p_impact_parameter',           'impact_parameter',           'real',      'float32',  'impact parameter'),
+    Column('p_impact_parameter_error_min', 'impact_parameter_error_min', 'real',      'float32',  'impact parameter error min'),
+    Column('p_impact_parameter_error_max', 'impact_parameter_error_max', 'real',      'float32',  'impact parameter error max'),
+    Column('p_temp_measured',              'temp_measured',              'real',      'float32',  'measured equilibrium temperature (K)'),
+    Column('p_geo_albedo',                 'geo_albedo',                 'real',      'float32',  'measured geometric albedo'),
+    Column('p_geo_albedo_error_min',       'geo_albedo_error_min',       'real',      'float32',  'measured geometric albedo error min'),
+    Column('p_geo_albedo_error_max',       'geo_albedo_error_max',       'real',      'float32',  'measured geometric albedo error max'),
+    Column('p_detection',                  'detection',                  'text',      'category', 'detection method'),
+    Column('p_detection_mass',             'detection_mass',             'text',      str,        'detection method for mass'),
+    Column('p_detection_radius',           'detection_radius',           'text',      str,        'detection method for radius'),
+    Column('p_alt_names',                  'alt_names',                  'text',      str,        'alternate names'),
+    Column('p_atmosphere',                 'atmosphere',                 'text',      str,        'atmosphere composition (no data yet)'),
+    Column('p_type',                       'type',                       'text',      'category', "planet type (PHL's mass-radius classification)"),
+    Column('p_escape',                     'escape',                     'real',      'float32',  'escape velocity (earth units)'),
+    Column('p_potential',                  'potential',                  'real',      'float32',  'gravitational potential (earth units)'),
+    Column('p_gravity',                    'gravity',                    'real',      'float32',  'gravity (earth units)'),
+    Column('p_density',                    'density',                    'real',      'float32',  'density (earth units)'),
+    Column('p_hill_sphere',                'hill_sphere',                'real',      'float32',  'hill sphere (AU)'),
+    Column('p_distance',                   'distance',                   'real',      'float32',  'planet mean distance from star (AU)'),
+    Column('p_periastron',                 'periastron',                 'real',      'float32',  'periastron (AU)'),
+    Column('p_apastron',                   'apastron',                   'real',      'float32',  'apastron (AU)'),
+    Column('p_distance_eff',               'distance_eff',               'real',      'float32',  'effective thermal distance from star (AU)'),
+    Column('p_flux',                       'flux',                       'real',      'float32',  'planet mean stellar flux (earth units)'),
+    Column('p_flux_min',                   'flux_min',                   'real',      'float32',  'planet minimum orbital stellar flux (earth units)'),
+    Column('p_flux_max',                   'flux_max',                   'real',      'float32',  'planet maximum orbital stellar flux (earth units)'),
+    Column('p_temp_equil',                 'temp_equil',                 'real',      'float32',  'equilibrium temperature assuming bond albedo 0.3 (K)'),
+    Column('p_temp_equil_min',             'temp_equil_min',             'real',      'float32',  'equilibrium minimum temperature assuming bond albedo 0.3 (K)'),
+    Column('p_temp_equil_max',             'temp_equil_max',             'real',      'float32',  'equilibrium maximum temperature assuming bond albedo 0.3 (K)'),
+    Column('p_habzone_opt',                'habzone_opt',                'boolean',   'Int8',     'the planet is in the optimistic habitable zone flag (1 = yes)'),
+    Column('p_habzone_con',                'habzone_con',                'boolean',   'Int8',     'the planet is in the conservative habitable zone flag (1 = yes)'),
+    Column('p_type_temp',                  'type_temp',                  'text',      'category', "thermal type (PHL's thermal classification)"),
+    Column('p_habitable',                  'habitable',                  'integer',   'Int64',    'planet is potentially habitable index (1 = conservative, 2 = optimistic)'),
+    Column('p_esi',                        'esi',                        'real',      'float32',  'Earth similarity index'),
+    Column(None,                           'star_id',                    'integer',   None,       'link back to star table'),
+], foreign_keys={'parent_star': ('star_id', 'stars')},
+   indexes=['star_id', 'detection', 'year_discovered'])
+
+# Parents come before children.
+TABLES = [CONSTELLATIONS, STARS, PLANETS]
+
+# Star age buckets, 1 Gy wide between the young and old limits (Gy) with one
+# bucket each below and above them.  star_age_proxy is for ordering purposes
+# only, it will not appear in the charts.  If we don't do this, then we
+# cannot put the youngest stars first.  The query also runs on DuckDB, see
+# phlsnapshot, hence the explicit integer casts.
+STAR_AGE_BUCKETS = """
+    case
+        when age is null or age = 'NaN' then 3
+        when age < %(young)s then 0
+        when age < %(old)s then 1
+        when age >= %(old)s then 2
+    end star_age_proxy,
+    case
+        when age is null or age = 'NaN' then 'No Data'
+        when age < %(young)s then '< ' || %(young)s::text
+        when age < %(old)s then floor(age)::integer::text || '-' || floor(age+1)::integer::text
+        when age >= %(old)s then '> ' || %(old)s::text
+    end star_age
+"""
+STAR_AGE_LIMITS = {'young': 1, 'old': 5}
+
+PLANET_SUMMARY = SummaryView('planet_summary', """
+    with cte as (
+        select detection, type, year_discovered,
+               count(*) over (partition by star_id) as planets
+          from planets
+    )
+    select
+        case
+            when grouping(detection) = 0 then 'detection'
+            when grouping(type) = 0 then 'type'
+            when grouping(year_discovered) = 0 then 'year_discovered'
+            else 'planets'
+        end dimension,
+        detection, type, year_discovered, planets,
+        -- A star with k planets is counted k times in its planets group.
+        -- DuckDB divides integers as floats, hence the cast.
+        cast(count(*) / coalesce(planets, 1) as bigint) as n
+    from cte
+    group by grouping sets ((detection), (type), (year_discovered), (planets))
+""")
+
+STAR_SUMMARY = SummaryView('star_summary', f"""
+    with cte as (
+        select type_temp, {STAR_AGE_BUCKETS}
+        from stars
+    )
+    select
+        case when grouping(type_temp) = 0 then 'type_temp' else 'star_age' end dimension,
+        type_temp, star_age_proxy, star_age, count(*) as n
+    from cte
+    group by grouping sets ((type_temp), (star_age_proxy, star_age))
+""", params=STAR_AGE_LIMITS)
+
+SUMMARY_VIEWS = [PLANET_SUMMARY, STAR_SUMMARY]
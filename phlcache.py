@@ -0,0 +1,133 @@
+"""
+On-disk cache of chart query results.
+
+Each result DataFrame is stored as a Parquet file named after the catalog
+version and a hash of the query and its parameters.  The catalog version is
+a stamp file that the loader writes at the end of every load, so a cached
+result can be served without touching the database at all, and a new load
+invalidates the results of the previous catalog.
+
+The cache is bounded in size and evicts the least recently used results
+first, going by file modification times, which are bumped on every hit.
+"""
+import hashlib
+import json
+import os
+import pathlib
+
+import pandas as pd
+
+
+CACHE_DIR = os.environ.get('PHL_CACHE_DIR', pathlib.Path.home() / '.cache' / 'phl')
+MAX_BYTES = 64 * 2**20
+VERSION_FILE = 'catalog_version'
+
+
+class ResultCache(object):
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=MAX_BYTES):
+        """
+        Parameters
+        ----------
+        directory : str or pathlib.Path
+            Where the stamp file and results are kept.
+        max_bytes : int
+            Evict results once their total size exceeds this.
+        """
+        self.directory = pathlib.Path(directory)
+        self.max_bytes = max_bytes
+
+    def version(self):
+        """
+        Returns
+        -------
+        str or None
+            The catalog version of the last load, if any.
+        """
+        try:
+            return (self.directory / VERSION_FILE).read_text().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def set_version(self, version):
+        """
+        Stamp a newly loaded catalog and drop the results of other versions.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / VERSION_FILE
+        tmp = path.with_suffix('.tmp')
+        tmp.write_text(f'{version}\n')
+        os.replace(tmp, path)
+
+        # Other files keyed on the version, such as the similarity index,
+        # go too.
+        for result in self.directory.glob('*-*.*'):
+            if not result.name.startswith(f'{version}-'):
+                result.unlink(missing_ok=True)
+
+    def path(self, version, sql, params=None):
+        query = json.dumps([sql, params], sort_keys=True, default=str)
+        digest = hashlib.sha256(query.encode()).hexdigest()[:32]
+        return self.directory / f'{version}-{digest}.parquet'
+
+    def fetch(self, sql, params, compute):
+        """
+        Return the cached result of a query, or compute(), cache and return
+        it.  Nothing is cached until the loader has stamped a version.
+        """
+        version = self.version()
+        if version is None:
+            return compute()
+
+        path = self.path(version, sql, params)
+        try:
+            df = pd.read_parquet(path)
+        except FileNotFoundError:
+            pass
+        else:
+            os.utime(path)
+            return df
+
+        df = compute()
+        self.store(path, df)
+        return df
+
+    def store(self, path, df):
+        # Write to a temporary file first, so that concurrent readers never
+        # see a partial result.
+        tmp = path.with_suffix(f'.{os.getpid()}.tmp')
+        df.to_parquet(tmp)
+        os.replace(tmp, path)
+        self.evict()
+
+    def evict(self):
+        """
+        Remove the least recently used results until the cache fits.
+        """
+        results = []
+        for path in self.directory.glob('*.parquet'):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            results.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in results)
+        for _, size, path in sorted(results):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+    def clear(self):
+        for path in self.directory.glob('*.parquet'):
+            path.unlink(missing_ok=True)
+
+
+def catalog_version(digest, fingerprint):
+    """
+    Compute the version stamp of a loaded catalog from the SHA-256 of its
+    file and the fingerprint of the schema and options it was loaded with,
+    see phlhash.
+    """
+    return hashlib.sha256(f'{digest}:{fingerprint}'.encode()).hexdigest()[:16]
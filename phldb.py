@@ -0,0 +1,351 @@
+"""
+Shared database access for the chart scripts.
+
+All queries go through one lazily created connection pool, which is closed
+when the interpreter exits.  Each summary the charts need has its own query
+function returning a DataFrame indexed on the summarized category.  They
+read the materialized summary views that the loader rebuilds after every
+load, so their cost depends on the number of categories, not of rows.
+
+Query results are kept in the on-disk cache of phlcache, so that charts of
+an unchanged catalog are drawn without connecting to the database.
+
+cone_search finds the stars and planets near a point of the sky through the
+declination zone index of skyindex, and similar_planets the planets most
+like a reference through the similarity index that the loader saves.
+habzone_orbits gives the input of the habitable zone what-if runs of
+habzone.
+
+Alternatively, the queries run through DuckDB on a Parquet snapshot written
+by the loader, see use_snapshot and the PHL_SNAPSHOT environment variable.
+"""
+import atexit
+import concurrent.futures
+import contextlib
+import os
+import threading
+
+import pandas as pd
+
+import habzone
+import phlcache
+import phlsnapshot
+import similarity
+import skyindex
+from phl_schema import STAR_AGE_BUCKETS, STAR_AGE_LIMITS
+
+
+DBNAME = 'phl'
+MAX_CONNECTIONS = 4
+
+_pool = None
+_duckdb = None
+_similarity = None
+
+# Guards the lazy creation of the pool, the DuckDB connection and the
+# similarity index.
+_lock = threading.Lock()
+
+cache = phlcache.ResultCache()
+
+# A Parquet snapshot to query instead of the database, if any.
+snapshot = os.environ.get('PHL_SNAPSHOT') or None
+
+
+def get_pool():
+    global _pool
+    with _lock:
+        if _pool is None:
+            # Cached results need no connection, so psycopg2 waits until now.
+            import psycopg2.pool
+            _pool = psycopg2.pool.ThreadedConnectionPool(1, MAX_CONNECTIONS, dbname=DBNAME)
+            atexit.register(close)
+    return _pool
+
+
+def use_snapshot(directory):
+    """
+    Run the queries on a Parquet snapshot, or on the database again if
+    directory is None.
+    """
+    global snapshot, _duckdb
+    with _lock:
+        snapshot = directory
+        _duckdb = None
+
+
+def catalog_version():
+    """
+    The version of the catalog that the queries see, if known.
+    """
+    if snapshot is not None:
+        return phlsnapshot.version(snapshot)
+    return cache.version()
+
+
+def close():
+    global _pool
+    if _pool is not None:
+        _pool.closeall()
+        _pool = None
+
+
+@contextlib.contextmanager
+def connection():
+    """
+    Borrow a connection from the pool.  Whatever transaction the caller
+    leaves open is rolled back before the connection is returned.
+    """
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        yield conn
+    finally:
+        conn.rollback()
+        pool.putconn(conn)
+
+
+def read(sql, params=None, index_col=None, cached=True):
+    """
+    Run a query on a pooled connection, unless its result is cached.
+
+    Parameters
+    ----------
+    sql : str
+        Query, with %(name)s placeholders for params.
+    params : dict, optional
+        Query parameters.
+    index_col : str, optional
+        Column to use as the index of the result.
+    cached : bool
+        If false, neither look up nor store the result, e.g. for ad-hoc
+        queries that are unlikely to be repeated.
+
+    Returns
+    -------
+    pd.DataFrame
+    """
+    if snapshot is not None:
+        return read_snapshot(sql, params, index_col)
+
+    def compute():
+        with connection() as conn:
+            return pd.read_sql(sql, conn, params=params, index_col=index_col)
+
+    if not cached:
+        return compute()
+    return cache.fetch(sql, [params, index_col], compute)
+
+
+def read_snapshot(sql, params=None, index_col=None):
+    """
+    Run a query through DuckDB on the snapshot.  It is fast enough not to
+    need the cache.
+    """
+    global _duckdb
+    with _lock:
+        if _duckdb is None:
+            _duckdb = phlsnapshot.connect(snapshot)
+        # A DuckDB connection must not be shared between threads, but each
+        # may use a cursor of its own.
+        cursor = _duckdb.cursor()
+    df = cursor.execute(phlsnapshot.duckdb_sql(sql), params).df()
+    if index_col is not None:
+        df = df.set_index(index_col)
+    return df
+
+
+def detection_counts():
+    sql = """
+       select detection, n
+         from planet_summary
+        where dimension = 'detection'
+     order by n
+    """
+    return read(sql, index_col='detection')
+
+
+def type_counts():
+    sql = """
+       select type, n
+         from planet_summary
+        where dimension = 'type'
+     order by n
+    """
+    return read(sql, index_col='type')
+
+
+def discovery_years():
+    sql = """
+       select year_discovered, n
+         from planet_summary
+        where dimension = 'year_discovered' and year_discovered is not null
+     order by year_discovered
+    """
+    return read(sql, index_col='year_discovered')
+
+
+def planets_per_star():
+    sql = """
+       select planets as n, n as count
+         from planet_summary
+        where dimension = 'planets'
+     order by planets
+    """
+    return read(sql, index_col='n')
+
+
+def star_age_buckets(young=STAR_AGE_LIMITS['young'], old=STAR_AGE_LIMITS['old']):
+    """
+    Count the stars by age, see STAR_AGE_BUCKETS.  Only the default limits
+    are materialized, others are computed from the stars table.
+    """
+    if {'young': young, 'old': old} == STAR_AGE_LIMITS:
+        sql = """
+           select star_age, n
+             from star_summary
+            where dimension = 'star_age'
+         order by star_age_proxy, star_age
+        """
+        return read(sql, index_col='star_age')
+
+    sql = f"""
+    with cte as (
+        select {STAR_AGE_BUCKETS}, count(*) as n
+        from stars
+        group by star_age, star_age_proxy
+    )
+    select star_age, n
+    from cte
+    order by star_age_proxy, star_age
+    """
+    return read(sql, params={'young': young, 'old': old}, index_col='star_age')
+
+
+def spectral_classes():
+    sql = """
+       select type_temp, n
+         from star_summary
+        where dimension = 'type_temp'
+     order by n
+    """
+    return read(sql, index_col='type_temp')
+
+
+def cone_search(ra, dec, radius):
+    """
+    Find the stars within a radius of a point of the sky, and their planets.
+
+    Only the candidate stars in the zones and ra ranges that the circle
+    crosses are read, then their exact angular distances are checked.
+
+    Parameters
+    ----------
+    ra, dec : float
+        Center in degrees.
+    radius : float
+        Radius in degrees.
+
+    Returns
+    -------
+    stars : pd.DataFrame
+        The stars, indexed on id, with their angular separation from the
+        center in degrees, nearest first.
+    planets : pd.DataFrame
+        The planets of those stars, indexed on id.
+    """
+    where, params = skyindex.cone_sql(ra, dec, radius)
+    # Every pointing is a new query, so caching the results would only push
+    # the chart summaries out of the cache.
+    stars = read(f'select * from stars where {where}', params=params, index_col='id',
+                 cached=False)
+    planets = read(f"""
+        select planets.*
+          from planets
+          join stars on stars.id = planets.star_id
+         where {where}
+    """, params=params, index_col='id', cached=False)
+
+    separation = skyindex.angular_distance(ra, dec, stars['ra'], stars['dec'])
+    stars = stars.assign(separation=separation)
+    stars = stars[stars['separation'] <= radius].sort_values('separation')
+    planets = planets[planets['star_id'].isin(stars.index)]
+    return stars, planets
+
+
+def habzone_orbits():
+    """
+    The planets' orbits and their stars' habitable zone bounds, indexed on
+    planet id, for habzone.classify and habzone.what_if.
+    """
+    return read(habzone.SQL, index_col='planet_id')
+
+
+def similarity_index():
+    """
+    The similarity index of the catalog, as saved by the loader.  It is
+    built from the planets table if need be, and kept in memory until the
+    catalog version changes.
+    """
+    global _similarity
+    version = catalog_version()
+    with _lock:
+        if _similarity is not None and _similarity[0] == version and version is not None:
+            return _similarity[1]
+
+    path = None if version is None else similarity.index_path(cache.directory, version)
+    if path is not None and path.exists():
+        index = similarity.SimilarityIndex.load(path)
+    else:
+        index = similarity.SimilarityIndex(read(similarity.SQL, index_col='name'))
+        if path is not None:
+            index.save(path)
+
+    with _lock:
+        _similarity = (version, index)
+    return index
+
+
+def similar_planets(reference=similarity.EARTH, k=10):
+    """
+    The k planets most similar to a reference, see
+    similarity.SimilarityIndex.nearest.
+
+    Parameters
+    ----------
+    reference : str or dict
+        A planet name, or its features, Earth by default.
+    k : int
+        Number of planets.
+
+    Returns
+    -------
+    pd.Series
+        Distances, indexed on planet name, nearest first.
+    """
+    return similarity_index().nearest(reference, k)
+
+
+def summary():
+    """
+    Fetch every chart summary, running the queries concurrently on pooled
+    connections.
+
+    Returns
+    -------
+    dict
+        DataFrames keyed by the name of their query function.
+    """
+    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_CONNECTIONS) as executor:
+        futures = {name: executor.submit(query) for name, query in SUMMARIES.items()}
+    return {name: future.result() for name, future in futures.items()}
+
+
+SUMMARIES = {
+    'detection_counts': detection_counts,
+    'type_counts': type_counts,
+    'discovery_years': discovery_years,
+    'planets_per_star': planets_per_star,
+    'star_age_buckets': star_age_buckets,
+    'spectral_classes': spectral_classes,
+}
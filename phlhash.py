@@ -0,0 +1,146 @@
+"""
+Change detection for catalog loads.
+
+The loader records the SHA-256 of every catalog file that it loads
+successfully, and a hash of each catalog row keyed on the planet name, in
+two metadata tables, along with a fingerprint of the schema and loader
+options that it was loaded with.  A file with the same digest and
+fingerprint as the last load needs no load at all.  Otherwise, if only the
+file changed, comparing the row hashes gives the exact planets that were
+added, changed or removed, in one streaming pass over the file.
+"""
+import csv
+import hashlib
+import io
+
+
+LOADS_TABLE = 'public.catalog_loads'
+ROWS_TABLE = 'public.catalog_rows'
+
+# Rows are keyed on this CSV column.
+NAME_COLUMN = 'P_NAME'
+
+BLOCK_SIZE = 2**20
+
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(BLOCK_SIZE), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def fingerprint(parts):
+    """
+    A short hash of some strings, e.g. the generated DDL and the loader
+    options.
+    """
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part.encode())
+        h.update(b'\x1e')
+    return h.hexdigest()[:16]
+
+
+def row_hashes(path):
+    """
+    Hash every row of a catalog file.
+
+    Returns
+    -------
+    dict
+        Maps each planet name onto the hash of its row.
+    """
+    hashes = {}
+    with open(path, newline='') as f:
+        reader = csv.reader(f)
+        key = next(reader).index(NAME_COLUMN)
+        for row in reader:
+            content = '\x1f'.join(row).encode()
+            hashes[row[key]] = hashlib.blake2b(content, digest_size=16).hexdigest()
+    return hashes
+
+
+def diff(stored, current):
+    """
+    Returns
+    -------
+    changed : set
+        Names of the planets that are new or whose rows changed.
+    removed : set
+        Names of the planets that are gone.
+    """
+    changed = {name for name, h in current.items() if stored.get(name) != h}
+    removed = stored.keys() - current.keys()
+    return changed, removed
+
+
+def last_load(cursor):
+    """
+    The last load recorded, or None if there is none or its tables are gone.
+
+    Returns
+    -------
+    dict or None
+        The catalog_loads row, whose fingerprint is None if it was recorded
+        before fingerprints were.
+    """
+    cursor.execute('select to_regclass(%s), to_regclass(%s)',
+                   (LOADS_TABLE, 'public.planets'))
+    if None in cursor.fetchone():
+        return None
+
+    cursor.execute(f'select * from {LOADS_TABLE} order by loaded_at desc limit 1')
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    load = {'fingerprint': None}
+    load.update(zip([d[0] for d in cursor.description], row))
+    return load
+
+
+def stored_row_hashes(cursor):
+    """
+    The row hashes of the last catalog file loaded, empty if there is none.
+    """
+    cursor.execute('select to_regclass(%s)', (ROWS_TABLE,))
+    if cursor.fetchone()[0] is None:
+        return {}
+
+    cursor.execute(f'select name, hash from {ROWS_TABLE}')
+    return dict(cursor.fetchall())
+
+
+def record_load(cursor, path, digest, fingerprint, hashes):
+    """
+    Record a successfully loaded catalog file, the fingerprint it was loaded
+    with and its row hashes.
+    """
+    cursor.execute(f"""
+        create table if not exists {LOADS_TABLE} (
+            sha256       text not null,
+            path         text,
+            planets      integer,
+            loaded_at    timestamp not null default now(),
+            fingerprint  text
+        )
+    """)
+    cursor.execute(f'alter table {LOADS_TABLE} add column if not exists fingerprint text')
+    cursor.execute(f"""
+        create table if not exists {ROWS_TABLE} (
+            name  text primary key,
+            hash  text not null
+        )
+    """)
+    cursor.execute(f"""
+        insert into {LOADS_TABLE} (sha256, path, planets, fingerprint)
+        values (%s, %s, %s, %s)
+    """, (digest, path, len(hashes), fingerprint))
+
+    cursor.execute(f'truncate {ROWS_TABLE}')
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerows(hashes.items())
+    buf.seek(0)
+    cursor.copy_expert(f'copy {ROWS_TABLE} (name, hash) from stdin with csv', buf)
@@ -0,0 +1,176 @@
+"""
+Parquet snapshot of the normalized catalog tables.
+
+The loader can write the constellations, stars and planets tables, ids
+included, as one Parquet dataset each, with the planets partitioned by
+discovery year.  Analyses read them with read_table, which only reads the
+requested columns and partitions and memory-maps the files, and phldb can
+run the chart queries on them through DuckDB, without a database server.
+
+pyarrow and duckdb are only imported when a snapshot is written or read.
+"""
+import io
+import os
+import pathlib
+import re
+import shutil
+
+import pandas as pd
+
+from phl_schema import SUMMARY_VIEWS, TABLES
+
+
+# Hive partition column of each partitioned table.
+PARTITIONS = {'planets': 'year_discovered'}
+VERSION_FILE = 'catalog_version'
+
+
+def table_dtypes(table):
+    """
+    The pandas dtypes of a database table's columns.  Booleans and integers
+    become nullable types, whatever the CSV catalog needed.
+    """
+    dtypes = {'id': 'int64'}
+    for col in table.columns:
+        if col.sqltype == 'boolean':
+            dtypes[col.target] = 'boolean'
+        elif col.sqltype == 'integer':
+            dtypes[col.target] = 'Int64'
+        elif col.dtype is not None:
+            dtypes[col.target] = col.dtype
+    return dtypes
+
+
+def read_database_table(cursor, table):
+    """
+    Read a whole table through COPY.
+
+    Returns
+    -------
+    pd.DataFrame
+    """
+    columns = ['id'] + [col.target for col in table.columns]
+    sql = f"copy (select {', '.join(columns)} from {table.name}) to stdout with csv header"
+    buf = io.BytesIO()
+    cursor.copy_expert(sql, buf)
+    buf.seek(0)
+
+    parse_dates = [col.target for col in table.columns if col.sqltype == 'timestamp']
+    return pd.read_csv(buf, dtype=table_dtypes(table), parse_dates=parse_dates,
+                       true_values=['t'], false_values=['f'])
+
+
+def write_snapshot(cursor, directory, version):
+    """
+    Write every table to a new snapshot, then replace any previous one.
+
+    Parameters
+    ----------
+    cursor : psycopg2 cursor
+        Where the tables are read from.
+    directory : str or pathlib.Path
+        The snapshot, one Parquet dataset per table.
+    version : str
+        Catalog version, see phlcache.catalog_version.
+
+    Returns
+    -------
+    int
+        Number of rows written.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    directory = pathlib.Path(directory)
+    tmp = directory.with_name(f'.{directory.name}.{os.getpid()}')
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+
+    rows = 0
+    for table in TABLES:
+        df = read_database_table(cursor, table)
+        partition = PARTITIONS.get(table.name)
+        pq.write_to_dataset(pa.Table.from_pandas(df, preserve_index=False),
+                            tmp / table.name,
+                            partition_cols=[partition] if partition else None,
+                            basename_template='part-{i}.parquet')
+        rows += len(df)
+    (tmp / VERSION_FILE).write_text(f'{version}\n')
+
+    # Readers of the old snapshot keep their open files, but new readers
+    # only ever see a complete snapshot.
+    retired = directory.with_name(f'.{directory.name}.retired')
+    shutil.rmtree(retired, ignore_errors=True)
+    if directory.exists():
+        os.rename(directory, retired)
+    os.rename(tmp, directory)
+    shutil.rmtree(retired, ignore_errors=True)
+    return rows
+
+
+def version(directory):
+    return (pathlib.Path(directory) / VERSION_FILE).read_text().strip()
+
+
+def read_table(directory, name, columns=None, filters=None):
+    """
+    Read a table of a snapshot.
+
+    Parameters
+    ----------
+    directory : str or pathlib.Path
+        The snapshot.
+    name : str
+        Table name.
+    columns : list of str, optional
+        Only read these columns.
+    filters : list, optional
+        pyarrow filters, e.g. [('year_discovered', '>=', 2010)].  Filters on
+        a partition column skip the other partitions entirely.
+
+    Returns
+    -------
+    pd.DataFrame
+    """
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+
+    partitioning = None
+    if name in PARTITIONS:
+        # Spell out the partition type, the files know nothing about it.
+        partition = PARTITIONS[name]
+        partitioning = ds.partitioning(pa.schema([(partition, pa.int64())]), flavor='hive')
+
+    path = pathlib.Path(directory) / name
+    table = pq.read_table(path, columns=columns, filters=filters,
+                          partitioning=partitioning, memory_map=True)
+    return table.to_pandas()
+
+
+def connect(directory):
+    """
+    Open an in-memory DuckDB database with a view onto each table of the
+    snapshot and the summary views materialized as tables.
+    """
+    import duckdb
+
+    directory = pathlib.Path(directory)
+    conn = duckdb.connect()
+    for table in TABLES:
+        path = directory / table.name / '**' / '*.parquet'
+        hive = 'true' if table.name in PARTITIONS else 'false'
+        conn.execute(f"""
+            create view {table.name} as
+            select * from read_parquet('{path}', hive_partitioning = {hive})
+        """)
+    for view in SUMMARY_VIEWS:
+        conn.execute(duckdb_sql(f'create table {view.name} as {view.query}'), view.params)
+    return conn
+
+
+def duckdb_sql(sql):
+    """
+    Rewrite the %(name)s query placeholders of psycopg2 as DuckDB's $name.
+    """
+    return re.sub(r'%\((\w+)\)s', r'$\1', sql)
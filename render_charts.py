@@ -0,0 +1,126 @@
+"""
+Render every chart to files, e.g. for the nightly report.
+
+The summaries are fetched once, then the charts are drawn headless with the
+Agg backend in a pool of processes.  Each chart is written as
+<chart>.<format> in the output directory, next to a manifest.json listing
+the files, their sizes and checksums, and the catalog version they show.
+"""
+import argparse
+import concurrent.futures
+import hashlib
+import json
+import os
+
+import matplotlib
+matplotlib.use('Agg')
+
+import charts
+import phldb
+
+
+FORMATS = ['png', 'svg']
+
+# Fixed SVG element ids, so that unchanged charts give identical files.
+matplotlib.rcParams['svg.hashsalt'] = 'phl'
+
+
+def render(name, df, path, dpi=100):
+    """
+    Draw one chart and save it.
+
+    Returns
+    -------
+    dict
+        The manifest entry for the file.
+    """
+    import matplotlib.pyplot as plt
+
+    chart, _ = charts.CHARTS[name]
+    fig, ax = charts.subplots()
+    try:
+        chart(df, ax)
+        fig.tight_layout()
+        # Leave out the creation date so that the output is reproducible.
+        metadata = {'Date': None} if path.endswith('.svg') else None
+        fig.savefig(path, dpi=dpi, metadata=metadata)
+    finally:
+        plt.close(fig)
+
+    with open(path, 'rb') as f:
+        content = f.read()
+    return {
+        'chart': name,
+        'file': os.path.basename(path),
+        'bytes': len(content),
+        'sha256': hashlib.sha256(content).hexdigest(),
+    }
+
+
+def render_all(output_dir, names=None, formats=('png',), dpi=100, workers=None):
+    """
+    Render the charts and write the manifest.
+
+    Parameters
+    ----------
+    output_dir : str
+        Where the files go, created if need be.
+    names : list of str, optional
+        Charts to render, by default all of charts.CHARTS.
+    formats : list of str
+        File formats, from FORMATS.
+    dpi : int
+        Resolution of the raster formats.
+    workers : int, optional
+        Size of the process pool, by default the number of CPUs.
+
+    Returns
+    -------
+    dict
+        The manifest.
+    """
+    names = list(charts.CHARTS) if names is None else names
+    os.makedirs(output_dir, exist_ok=True)
+
+    summary = phldb.summary()
+
+    # Import seaborn before the workers are forked, rather than once in each.
+    charts.set_theme()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(render, name, summary[charts.CHARTS[name][1]],
+                            os.path.join(output_dir, f'{name}.{fmt}'), dpi)
+            for name in names
+            for fmt in formats
+        ]
+        files = [future.result() for future in futures]
+
+    manifest = {
+        'catalog_version': phldb.catalog_version(),
+        'files': files,
+    }
+    with open(os.path.join(output_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Render the PHL charts to files.')
+    parser.add_argument('--output-dir', default='figures')
+    parser.add_argument('--charts', nargs='+', choices=list(charts.CHARTS),
+                        help='charts to render, by default all of them')
+    parser.add_argument('--format', nargs='+', choices=FORMATS, default=['png'],
+                        dest='formats')
+    parser.add_argument('--dpi', type=int, default=100)
+    parser.add_argument('--workers', type=int, help='size of the process pool')
+    parser.add_argument('--snapshot', metavar='DIR',
+                        help='draw from a Parquet snapshot instead of the database')
+    args = parser.parse_args()
+
+    if args.snapshot is not None:
+        phldb.use_snapshot(args.snapshot)
+
+    manifest = render_all(args.output_dir, names=args.charts, formats=args.formats,
+                          dpi=args.dpi, workers=args.workers)
+    for entry in manifest['files']:
+        print(os.path.join(args.output_dir, entry['file']))
@@ -0,0 +1,181 @@
+"""
+Nearest-neighbour search for similar planets.
+
+Planets are compared on FEATURES.  The features that span orders of
+magnitude are taken as logarithms, then every feature is standardized to
+zero mean and unit variance over the catalog, so that each weighs the same
+in the Euclidean distance.  A KD-tree over the standardized features
+answers top-k and radius queries without scanning the catalog.
+
+Missing values are handled by an explicit policy.  With 'drop', planets
+missing any feature, or with a non-positive value of a logarithmic one, are
+left out of the index and listed in its excluded attribute.  With 'impute',
+their missing features are set to the catalog median, and the imputed
+attribute says which.  Queries always need every feature of the reference.
+
+The loader builds the index of every new catalog and saves it in the cache
+directory under the catalog version, see phlcache.  scipy is only imported
+when an index is built or loaded.
+"""
+import pathlib
+import pickle
+
+import numpy as np
+import pandas as pd
+
+
+FEATURES = ['esi', 'radius', 'mass', 'flux', 'temp_equil']
+LOG_FEATURES = {'radius', 'mass', 'flux', 'temp_equil'}
+MISSING_POLICIES = ['drop', 'impute']
+
+# Columns of the logarithmic features.
+LOG_COLUMNS = [i for i, feature in enumerate(FEATURES) if feature in LOG_FEATURES]
+
+# Earth, in the units of the planets table.
+EARTH = {'esi': 1.0, 'radius': 1.0, 'mass': 1.0, 'flux': 1.0, 'temp_equil': 255.0}
+
+SQL = f"select name, {', '.join(FEATURES)} from planets"
+
+
+def index_path(directory, version):
+    return pathlib.Path(directory) / f'{version}-similarity.pkl'
+
+
+def transform(x):
+    """
+    Take the logarithm of the logarithmic features.  Non-positive values
+    become NaN.
+
+    Parameters
+    ----------
+    x : np.ndarray
+        One row per planet, one column per feature, in FEATURES order.
+
+    Returns
+    -------
+    np.ndarray
+    """
+    x = np.array(x, dtype='float64')
+    logs = x[..., LOG_COLUMNS]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x[..., LOG_COLUMNS] = np.where(logs > 0, np.log10(logs), np.nan)
+    return x
+
+
+class SimilarityIndex(object):
+    """
+    A KD-tree over the standardized features of the planets.
+    """
+
+    def __init__(self, planets, missing='drop'):
+        """
+        Parameters
+        ----------
+        planets : pd.DataFrame
+            The FEATURES columns, indexed on planet name.
+        missing : str
+            Missing value policy, 'drop' or 'impute'.
+        """
+        from scipy.spatial import cKDTree
+
+        if missing not in MISSING_POLICIES:
+            raise ValueError(f'missing must be one of {MISSING_POLICIES}, not {missing!r}')
+        self.missing = missing
+
+        x = transform(planets[FEATURES].to_numpy(dtype='float64', na_value=np.nan))
+        nan = np.isnan(x)
+        incomplete = nan.any(axis=1)
+        if missing == 'drop':
+            self.excluded = planets.index[incomplete]
+            self.imputed = pd.DataFrame(columns=FEATURES, dtype=bool)
+            x = x[~incomplete]
+            names = planets.index[~incomplete]
+        else:
+            self.excluded = planets.index[:0]
+            self.imputed = pd.DataFrame(nan[incomplete], index=planets.index[incomplete],
+                                        columns=FEATURES)
+            x = np.where(nan, np.nanmedian(x, axis=0), x)
+            names = planets.index
+
+        self.mean = x.mean(axis=0)
+        self.scale = x.std(axis=0)
+        # A constant feature cannot tell planets apart anyway.
+        self.scale[self.scale == 0] = 1
+        self.names = np.asarray(names)
+        self.positions = pd.Series(np.arange(len(names)), index=names)
+        self.tree = cKDTree((x - self.mean) / self.scale)
+
+    def __len__(self):
+        return len(self.names)
+
+    def point(self, reference):
+        """
+        The standardized features of a reference.
+
+        Parameters
+        ----------
+        reference : str or dict
+            The name of an indexed planet, or its features.
+        """
+        if isinstance(reference, str):
+            try:
+                return self.tree.data[self.positions[reference]]
+            except KeyError:
+                raise KeyError(f'{reference} is not in the similarity index') from None
+
+        x = transform([reference.get(feature, np.nan) for feature in FEATURES])
+        if np.isnan(x).any():
+            missing = [f for f, value in zip(FEATURES, x) if np.isnan(value)]
+            raise ValueError(f'reference is missing {", ".join(missing)}')
+        return (x - self.mean) / self.scale
+
+    def nearest(self, reference=EARTH, k=10):
+        """
+        The k planets most similar to a reference, Earth by default.  A
+        planet of the index is its own nearest neighbour at distance 0.
+
+        Returns
+        -------
+        pd.Series
+            Distances in standardized units, indexed on planet name,
+            nearest first.
+        """
+        k = min(k, len(self))
+        distances, positions = self.tree.query(self.point(reference), k=k)
+        distances, positions = np.atleast_1d(distances), np.atleast_1d(positions)
+        return pd.Series(distances, index=pd.Index(self.names[positions], name='name'),
+                         name='distance')
+
+    def within(self, reference=EARTH, radius=1.0):
+        """
+        The planets within a distance of a reference, nearest first.
+        """
+        point = self.point(reference)
+        positions = np.asarray(self.tree.query_ball_point(point, radius), dtype=int)
+        distances = np.sqrt(((self.tree.data[positions] - point) ** 2).sum(axis=1))
+        order = np.argsort(distances, kind='stable')
+        return pd.Series(distances[order],
+                         index=pd.Index(self.names[positions[order]], name='name'),
+                         name='distance')
+
+    def save(self, path):
+        path = pathlib.Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix('.tmp')
+        with open(tmp, 'wb') as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp.replace(path)
+
+    @staticmethod
+    def load(path):
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+
+def build(cursor, missing='drop'):
+    """
+    Build the index of the loaded catalog.
+    """
+    cursor.execute(SQL)
+    planets = pd.DataFrame(cursor.fetchall(), columns=['name'] + FEATURES)
+    return SimilarityIndex(planets.set_index('name'), missing=missing)
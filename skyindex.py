@@ -0,0 +1,110 @@
+"""
+Declination zone index for cone searches on the stars' positions.
+
+The sky is cut into horizontal strips of ZONE_HEIGHT degrees of
+declination, and each star is stored with the number of its strip.  With
+an index on (sky_zone, ra), the stars within a radius of a point are found
+by scanning one short ra range in each of the few strips that the circle
+crosses, and then checking the exact angular distance of those candidates
+only.
+"""
+import numpy as np
+import pandas as pd
+
+
+ZONE_HEIGHT = 0.5
+
+
+def zone(dec):
+    """
+    The zone of each declination.
+
+    Parameters
+    ----------
+    dec : pd.Series or array_like
+        Declinations in degrees, NaN if unknown.
+
+    Returns
+    -------
+    pd.Series
+        Zone numbers, counted up from the south pole, with missing values
+        where the declination is unknown.  A Series keeps its index.
+    """
+    dec = pd.Series(dec, dtype='float64')
+    return np.floor((dec + 90) / ZONE_HEIGHT).astype('Int64')
+
+
+def zone_range(dec, radius):
+    """
+    The first and last zone crossed by a circle.
+    """
+    low = max(dec - radius, -90.0)
+    high = min(dec + radius, 90.0)
+    return int(np.floor((low + 90) / ZONE_HEIGHT)), int(np.floor((high + 90) / ZONE_HEIGHT))
+
+
+def ra_ranges(ra, dec, radius):
+    """
+    The ranges of right ascension that a circle crosses, as closed
+    intervals within [0, 360].  A circle around a pole covers every right
+    ascension, and one across ra = 0 is split in two.
+
+    Parameters
+    ----------
+    ra, dec : float
+        Center of the circle in degrees.
+    radius : float
+        Radius of the circle in degrees.
+
+    Returns
+    -------
+    list of (float, float)
+    """
+    if abs(dec) + radius >= 90:
+        return [(0.0, 360.0)]
+
+    # Half-width in ra of the circle, at the declination of its tangent
+    # points.
+    alpha = float(np.degrees(np.arcsin(np.sin(np.radians(radius)) / np.cos(np.radians(dec)))))
+    low, high = (ra - alpha) % 360, (ra + alpha) % 360
+    if low <= high:
+        return [(low, high)]
+    return [(0.0, high), (low, 360.0)]
+
+
+def angular_distance(ra1, dec1, ra2, dec2):
+    """
+    Angular distance in degrees between points on the sphere, by the
+    haversine formula, which stays accurate for small distances.
+    """
+    ra1, dec1, ra2, dec2 = (np.radians(np.asarray(x, dtype='float64'))
+                            for x in (ra1, dec1, ra2, dec2))
+    h = (np.sin((dec2 - dec1) / 2) ** 2
+         + np.cos(dec1) * np.cos(dec2) * np.sin((ra2 - ra1) / 2) ** 2)
+    return np.degrees(2 * np.arcsin(np.sqrt(np.clip(h, 0, 1))))
+
+
+def cone_sql(ra, dec, radius, alias='stars'):
+    """
+    The where clause selecting the candidate stars of a cone search through
+    the (sky_zone, ra) index.
+
+    Returns
+    -------
+    sql : str
+        Condition on the sky_zone and ra columns of alias.
+    params : dict
+        Its parameters.
+    """
+    first, last = zone_range(dec, radius)
+    params = {'first_zone': first, 'last_zone': last}
+
+    ranges = []
+    for i, (low, high) in enumerate(ra_ranges(ra, dec, radius)):
+        ranges.append(f'{alias}.ra between %(ra_low_{i})s and %(ra_high_{i})s')
+        params[f'ra_low_{i}'] = low
+        params[f'ra_high_{i}'] = high
+
+    sql = (f'{alias}.sky_zone between %(first_zone)s and %(last_zone)s '
+           f'and ({" or ".join(ranges)})')
+    return sql, params
@@ -0,0 +1,120 @@
+"""
+Rule-based validation of the catalog before it is written.
+
+Each rule computes a boolean NumPy mask of the offending rows from whole
+columns of the lower-cased catalog DataFrame, and the columns it names are
+cleared in those rows.  The masks are all computed before anything is
+cleared, so the rules do not depend on their order.
+"""
+import collections
+
+import numpy as np
+import pandas as pd
+
+from phl_schema import TABLES
+
+
+# name:         rule name, as reported and quarantined
+# columns:      catalog columns that are cleared where the rule fails
+# mask:         function of the DataFrame returning the offending rows
+# description:  what is wrong with the offending rows
+Rule = collections.namedtuple('Rule', ['name', 'columns', 'mask', 'description'])
+
+
+def values(df, column):
+    """
+    A numeric column as floats, with missing values as NaN, which never
+    compare true.
+    """
+    return df[column].to_numpy(dtype='float64', na_value=np.nan)
+
+
+def flag(df, column):
+    """
+    A boolean column, with missing values as false.
+    """
+    return df[column].fillna(False).to_numpy(dtype=bool)
+
+
+def error_pair_rules():
+    """
+    A rule for every catalog error range whose lower bound is above its
+    upper bound.
+    """
+    rules = []
+    for table in TABLES:
+        sources = set(table.sources)
+        for low in table.sources:
+            if not low.endswith('_error_min'):
+                continue
+            high = low[:-len('min')] + 'max'
+            if high not in sources:
+                continue
+            rules.append(Rule(
+                f'{low[:-len("_min")]}_inverted', [low, high],
+                lambda df, low=low, high=high: values(df, low) > values(df, high),
+                f'{low} is greater than {high}',
+            ))
+    return rules
+
+
+RULES = [
+    Rule('negative_star_age', ['s_age'],
+         lambda df: values(df, 's_age') < 0,
+         'star age is negative'),
+    Rule('eccentricity_out_of_range', ['p_eccentricity'],
+         lambda df: (values(df, 'p_eccentricity') < 0) | (values(df, 'p_eccentricity') >= 1),
+         'eccentricity is outside [0, 1)'),
+    Rule('esi_out_of_range', ['p_esi'],
+         lambda df: (values(df, 'p_esi') < 0) | (values(df, 'p_esi') > 1),
+         'Earth similarity index is outside [0, 1]'),
+    # The conservative habitable zone lies within the optimistic one.
+    Rule('habzone_flags_inconsistent', ['p_habzone_opt', 'p_habzone_con'],
+         lambda df: flag(df, 'p_habzone_con') & ~flag(df, 'p_habzone_opt'),
+         'planet is in the conservative but not the optimistic habitable zone'),
+] + error_pair_rules()
+
+
+def validate(df, rules=RULES):
+    """
+    Apply the rules to a catalog DataFrame, in place.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Catalog rows, with lower-cased column names.
+    rules : list of Rule
+        Rules to apply.
+
+    Returns
+    -------
+    counts : collections.Counter
+        Number of offending rows per rule.
+    quarantine : pd.DataFrame
+        One row per offending row and rule:  the rule, the planet name and
+        the original values of the cleared columns as a JSON object.
+    """
+    masks = [(rule, rule.mask(df)) for rule in rules]
+
+    counts = collections.Counter()
+    quarantined = []
+    for rule, mask in masks:
+        n = int(mask.sum())
+        if n == 0:
+            continue
+        counts[rule.name] = n
+
+        original = df.loc[mask, rule.columns]
+        quarantined.append(pd.DataFrame({
+            'rule': rule.name,
+            'planet': df.loc[mask, 'p_name'].to_numpy(),
+            'original': original.to_json(orient='records', lines=True).splitlines(),
+        }))
+        for column in rule.columns:
+            df.loc[mask, column] = None
+
+    if quarantined:
+        quarantine = pd.concat(quarantined, ignore_index=True)
+    else:
+        quarantine = pd.DataFrame(columns=['rule', 'planet', 'original'])
+    return counts, quarantine